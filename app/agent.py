@@ -5,11 +5,20 @@ Follows clean architecture: modular, testable, extensible.
 from langchain.llms import Ollama
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
+from langchain_community.embeddings import OllamaEmbeddings
 import chromadb
 import logging
-from typing import List, Dict
-from config import MODEL_NAME, CHROMA_COLLECTION, OLLAMA_HOST
+from typing import List, Dict, Optional
+from llm.ollama_llm_interface import get_embeddings
+from memory.semantic_cache import SemanticCache
+from config import MODEL_NAME, CHROMA_COLLECTION, CHROMA_PATH, CHROMA_HOST, CHROMA_PORT, OLLAMA_HOST, OLLAMA_NUM_CTX, OLLAMA_KEEP_ALIVE
 import re
+import hashlib
+import atexit
+import queue
+import threading
+import time
+from functools import lru_cache
 
 # Constants
 # MODEL_NAME and CHROMA_COLLECTION are now imported from config.py for environment-driven configuration
@@ -18,70 +27,223 @@ import re
 logger = logging.getLogger("agent")
 logger.setLevel(logging.INFO)
 
+# HNSW settings for the history collection (applied when the collection is first created).
+# Cosine space for similarity search over stored prompts; M=32 / construction_ef=200 build a denser graph
+# for the <100k prompts we expect; search_ef=64 trades a little latency for much better recall.
+HISTORY_COLLECTION_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64,
+}
+
+# Single-pass pattern for _strip_code_fences: a fence (with optional language id) or
+# a language identifier on the first line. Remaining single backticks are removed with str.replace.
+# Deliberately not MULTILINE: one-word lines such as `pass` inside the code must survive.
+_STRIP_RE = re.compile(r"```[a-zA-Z0-9]*\n?|^\s*[a-zA-Z0-9]+\s*\n")
+
+def _doc_id(*parts: str) -> str:
+    """
+    Stable, process-independent document ID (blake2b-128 hex) over the given parts.
+    Parts are fed incrementally, so no concatenated copy of large prompts is built.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")  # separator: ("ab", "c") and ("a", "bc") must not collide
+    return h.hexdigest()
+
+@lru_cache(maxsize=None)
+def _chroma_client():
+    """
+    Process-wide persistent ChromaDB client, opened on first use. Persisting to CHROMA_PATH
+    keeps history and cached responses across runs instead of starting cold every process.
+    Uses the Chroma server at CHROMA_HOST instead when one is configured.
+    """
+    if CHROMA_HOST:
+        return chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+    return chromadb.PersistentClient(path=CHROMA_PATH)
+
+def _embedder() -> OllamaEmbeddings:
+    """Process-wide embedding client for EMBEDDING_MODEL, shared by all Agents, writers and the memory service."""
+    return get_embeddings()
+
+class _ChromaWriter:
+    """
+    Write-behind queue for one Chroma collection. submit() returns immediately; a daemon
+    thread upserts queued entries in batches of up to batch_size, or whatever arrived within
+    flush_interval seconds of the first entry, so callers never wait on Chroma's insert path.
+    Entries submitted without an embedding are embedded together in one embed_documents call
+    (a single /api/embed request) per batch. Pending entries are drained on close() (registered with atexit).
+    """
+    _STOP = object()
+
+    def __init__(self, collection, embeddings: OllamaEmbeddings, batch_size: int = 50, flush_interval: float = 0.2):
+        self.collection = collection
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="chroma-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, document: str, metadata: dict, doc_id: str,
+               embedding: Optional[List[float]] = None, embed_text: Optional[str] = None):
+        """Queues an entry; pass either a precomputed embedding or the text to embed at flush time."""
+        self._queue.put((doc_id, document, metadata, embedding, embed_text))
+
+    def close(self, timeout: float = 10.0):
+        """Flushes pending entries and stops the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(self._STOP)
+        self._thread.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is self._STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+
+    def _flush(self, batch: list):
+        # Chroma rejects duplicate IDs within one call; the latest entry for an ID wins
+        entries = {doc_id: [document, metadata, embedding, embed_text]
+                   for doc_id, document, metadata, embedding, embed_text in batch}
+        try:
+            missing = [entry for entry in entries.values() if entry[2] is None]
+            if missing:
+                # One /api/embed round-trip for the whole batch instead of one per entry
+                vectors = self.embeddings.embed_documents([entry[3] for entry in missing])
+                for entry, vector in zip(missing, vectors):
+                    entry[2] = vector
+            self.collection.upsert(
+                ids=list(entries),
+                documents=[entry[0] for entry in entries.values()],
+                metadatas=[entry[1] for entry in entries.values()],
+                embeddings=[entry[2] for entry in entries.values()]
+            )
+            logger.info(f"Persisted {len(entries)} history items.")
+        except Exception as e:
+            logger.error(f"Failed to persist {len(entries)} history items: {e}")
+
 class Agent:
-    def __init__(self):
-        # Initialize Ollama LLM
-        self.llm = Ollama(model=MODEL_NAME, base_url=OLLAMA_HOST)
+    def __init__(self, llm=None):
+        # Use the caller's LLM client when given (e.g. the API's shared one), else initialize Ollama LLM
+        self.llm = llm or Ollama(model=MODEL_NAME, base_url=OLLAMA_HOST, num_ctx=OLLAMA_NUM_CTX, keep_alive=OLLAMA_KEEP_ALIVE)
+        # Embeddings for history and the response caches (prompt -> stored response)
+        self.embeddings = _embedder()
         # Initialize ChromaDB for history/RAG
-        self.chroma_client = chromadb.Client()
-        self.collection = self.chroma_client.get_or_create_collection(CHROMA_COLLECTION)
+        self.chroma_client = _chroma_client()
+        self.collection = self.chroma_client.get_or_create_collection(
+            CHROMA_COLLECTION, metadata=HISTORY_COLLECTION_METADATA
+        )
+        # Response caches on the same persistent client; the generation cache is the one the API's
+        # AgenticAIService uses too. Reviews get their own exact-match-only collection.
+        self.response_cache = SemanticCache(self.chroma_client, self.embeddings)
+        self.review_cache = SemanticCache(self.chroma_client, self.embeddings, collection_name="agent_review_cache")
+        # History and cache writes are batched off the request path
+        self._writer = _ChromaWriter(self.collection, self.embeddings)
+        self._response_cache_writer = _ChromaWriter(self.response_cache.collection, self.embeddings)
+        self._review_cache_writer = _ChromaWriter(self.review_cache.collection, self.embeddings)
 
     def _strip_code_fences(self, text: str) -> str:
         """
         Remove markdown code fences, language identifiers, and leading/trailing whitespace from LLM output.
         """
-        # Remove all triple backtick code blocks (with or without language identifier)
-        text = re.sub(r"```[a-zA-Z0-9]*\\n", "", text)  # Remove opening ```python\n or similar
-        text = re.sub(r"```", "", text)  # Remove any remaining closing ```
-        # Remove any language identifier left on its own line (e.g., 'python' at the start, even with leading whitespace)
-        text = re.sub(r"^\s*([a-zA-Z0-9]+)\s*\n", "", text)
-        # Remove any remaining single backticks
-        text = re.sub(r"`([^`]*)`", r"\1", text)
-        return text.strip()
+        # Fences and the leading language id are dropped; inline `code` keeps its contents
+        return _STRIP_RE.sub("", text).replace("`", "").strip()
+
+    @staticmethod
+    def _cache_later(cache: SemanticCache, writer: _ChromaWriter, key: str, response: str,
+                     embedding: Optional[List[float]]):
+        """Queues a cache entry on the cache's write-behind writer (embedding the key at flush if needed)."""
+        document, metadata, doc_id = cache.entry(key, response)
+        writer.submit(document, metadata, doc_id, embedding=embedding, embed_text=key)
 
     def generate_code(self, task: str, context: str = "") -> str:
         """
         Generate code for a given task using LLM and LangChain.
+        Serves exact or near-identical prompts from the response cache before calling the LLM.
         Persists the request and response in vector DB for RAG.
         """
+        key = SemanticCache.make_key(task, context)
+        try:
+            cached, embedding = self.response_cache.lookup(key)
+        except Exception as e:
+            # A cache outage must not take generation down with it
+            logger.warning(f"Response cache lookup failed, calling the LLM: {e}")
+            cached, embedding = None, None
+        if cached is not None:
+            logger.info(f"Cache hit for task: {task}")
+            return cached
         prompt = PromptTemplate.from_template(
             """You are a senior software developer. Task: {task}\nContext: {context}\nGenerate production-ready code."""
         )
         chain = LLMChain(llm=self.llm, prompt=prompt)
         response = chain.run({"task": task, "context": context})
-        # Persist to vector DB
-        self.collection.add(
-            documents=[response],
-            metadatas=[{"task": task, "context": context}],
-            ids=[str(hash(task + context))]
+        # Post-process to remove markdown/code fences
+        code = self._strip_code_fences(response)
+        # Persist to vector DB (write-behind); the cache stores what callers receive
+        self._writer.submit(
+            response, {"type": "generation", "task": task, "context": context}, _doc_id(task, context),
+            embedding=embedding, embed_text=key
         )
+        self._cache_later(self.response_cache, self._response_cache_writer, key, code, embedding)
         logger.info(f"Code generated for task: {task}")
-        # Post-process to remove markdown/code fences
-        return self._strip_code_fences(response)
+        return code
 
     def review_code(self, code: str) -> str:
         """
         Review code for quality, bugs, and improvements.
+        Identical code is served from the review cache (exact match only: near-identical
+        code can still differ in the bug being reviewed).
         Persists the review in vector DB.
         """
+        try:
+            cached, _ = self.review_cache.lookup(code, semantic=False)
+        except Exception as e:
+            logger.warning(f"Review cache lookup failed, calling the LLM: {e}")
+            cached = None
+        if cached is not None:
+            logger.info("Cache hit for code review.")
+            return cached
         prompt = PromptTemplate.from_template(
             """You are a senior software developer. Review the following code for quality, bugs, and improvements:\n{code}"""
         )
         chain = LLMChain(llm=self.llm, prompt=prompt)
         response = chain.run({"code": code})
-        self.collection.add(
-            documents=[response],
-            metadatas=[{"reviewed_code": code}],
-            ids=[str(hash(code))]
-        )
-        logger.info("Code review completed.")
         # Post-process to remove markdown/code fences
-        return self._strip_code_fences(response)
+        review = self._strip_code_fences(response)
+        # Embedded at flush time, batched with other pending writes
+        self._writer.submit(response, {"type": "review", "reviewed_code": code}, _doc_id(code), embed_text=code)
+        self._cache_later(self.review_cache, self._review_cache_writer, code, review, None)
+        logger.info("Code review completed.")
+        return review
 
-    def get_history(self, limit: int = 10) -> List[Dict]:
+    def get_history(self, limit: int = 10, offset: int = 0) -> List[Dict]:
         """
         Retrieve recent agent history from vector DB.
+        Limit and offset are applied by Chroma, and only documents and metadata are loaded.
         """
-        results = self.collection.get(limit=limit)
+        results = self.collection.get(limit=limit, offset=offset, include=["documents", "metadatas"])
         logger.info(f"Fetched {len(results['documents'])} history items.")
         return results
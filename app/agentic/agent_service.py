@@ -1,48 +1,41 @@
-from typing import List
+from typing import Any, List, Tuple, Union
+from dataclasses import dataclass
+from functools import lru_cache
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import logging
+import threading
 import time
 import re
+import statistics
+from langchain_core.agents import AgentAction, AgentFinish
 from langchain_core.prompts import PromptTemplate
 from langchain_core.language_models import BaseLanguageModel
 from langchain_core.tools import BaseTool
 from langchain.agents import AgentExecutor, create_react_agent
-from dto.code_generation import CodeGenerationResponse
+from langchain.agents.output_parsers import ReActSingleInputOutputParser
+from agent import Agent
 from memory.chroma_memory_service import ChromaMemoryService
+from memory.semantic_cache import SemanticCache
 
 logger = logging.getLogger(__name__)
 
 MAX_AGENT_ITERATIONS = 8  # Increased from 3 to 8 for deeper tool use
-MAX_AGENT_EXECUTION_TIME = 60  # Increased from 15 to 60 seconds for longer tasks
-CODE_BLOCK_REGEX = r"```(?:python)?\n(.*?)```"
+MAX_AGENT_EXECUTION_TIME = 60  # Upper bound for the adaptive per-run timeout (seconds)
+MIN_AGENT_EXECUTION_TIME = 10  # Lower bound for the adaptive per-run timeout (seconds)
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = 20  # Runs needed before the p95 is trusted over MAX_AGENT_EXECUTION_TIME
+CODE_BLOCK_REGEX = re.compile(r"```(?:python)?\n(.*?)```", re.DOTALL)
+# AgentExecutor's "force" early stop ends the run with this as a normal output; it is an error, not code
+AGENT_STOPPED_OUTPUT = "Agent stopped due to iteration limit or time limit."
+EXECUTOR_CACHE_SIZE = 8  # Distinct (LLM, tool set) executors kept alive per process
+# One "Action: ... / Action Input: ..." pair per match; several pairs in one step run in parallel
+ACTION_PAIR_REGEX = re.compile(r"^Action\s*:[ \t]*(.+?)[ \t]*\n+Action\s*Input\s*:[ \t]*(.*?)[ \t]*$", re.MULTILINE)
 
-
-class AgenticAIService:
-    """
-    A service for creating and running a ReAct agent with given tools and an Ollama LLM.
-    Automatically optimizes for speed by skipping the ReAct loop when no tools are loaded.
-    """
-
-    def __init__(self, llm: BaseLanguageModel, tools: List[BaseTool], memory_service: ChromaMemoryService = None, verbose: bool = False):
-        self.llm = llm
-        self.tools = tools or []
-        self.memory_service = memory_service
-        self.verbose = verbose
-
-        logger.info(f"Initializing agent with {len(self.tools)} tools.")
-        self.prompt = self._build_prompt()
-
-        # Only create the agent executor if there are tools
-        self.agent_executor = self._create_agent_executor() if self.tools else None
-
-    def _build_prompt(self) -> PromptTemplate:
-        """
-        Builds a robust prompt for the ReAct agent.
-        Matches LangChain's expected variables: {tools}, {tool_names}.
-        """
-        tools_str = "\n".join([f"- {tool.name}: {tool.description}" for tool in self.tools])
-        tool_names_str = ", ".join([tool.name for tool in self.tools])
-
-        prompt_template = """
+# Static ReAct template. Everything before "Question:" is identical across requests for a
+# given tool set, so Ollama can reuse the KV cache for that prefix instead of re-running
+# prefill; the variable parts ({input}, {agent_scratchpad}) must stay at the very end.
+REACT_PROMPT_TEMPLATE = """
 You are an advanced AI assistant that uses the ReAct reasoning framework.
 
 You have access to the following tools:
@@ -56,6 +49,7 @@ Question: the input question you must answer
 Thought: your reasoning about what to do next
 Action: the tool name to use (must be one of [{tool_names}])
 Action Input: the input for that tool
+(if several lookups are independent, list each Action/Action Input pair before the Observation; they run in parallel)
 Observation: the result from the tool
 ... (repeat Thought/Action/Action Input/Observation as needed)
 Final Answer: the final answer to the original question
@@ -64,13 +58,181 @@ Begin!
 
 Question: {input}
 {agent_scratchpad}
-"""
+""".strip()
+
+# Minimal two-call flow used instead of ReAct when exactly one tool is loaded (no ~300-token
+# format preamble, no Thought/Action parsing). Static text first, variable parts last.
+SINGLE_TOOL_INPUT_TEMPLATE = """Use the {tool_name} tool ({tool_description}) to answer the question.
+Reply with the tool input only, on one line.
+Question: {input}
+Tool input:"""
+SINGLE_TOOL_ANSWER_TEMPLATE = """Answer the question using the tool result.
+Tool result: {observation}
+Question: {input}
+Answer:"""
+
+
+@lru_cache(maxsize=32)
+def _render_tools(tools_key: Tuple[Tuple[str, str], ...]) -> Tuple[str, str]:
+    """
+    Renders the tool list and tool names for the prompt, memoized per tool set so
+    identical tool sets always produce the identical (cache-friendly) prompt prefix.
+    :param tools_key: (name, description) pairs of the loaded tools, sorted by name.
+    :return: (tools_str, tool_names_str)
+    """
+    tools_str = "\n".join(f"- {name}: {description}" for name, description in tools_key)
+    tool_names_str = ", ".join(name for name, _ in tools_key)
+    return tools_str, tool_names_str
+
+
+# (id(llm), tool names, verbose) -> (llm, executor). The llm reference pins the id while cached.
+_executor_cache: "OrderedDict[tuple, Tuple[BaseLanguageModel, AgentExecutor]]" = OrderedDict()
+_executor_cache_lock = threading.Lock()
+# Durations of recent agent executor runs (seconds), for the adaptive timeout
+_run_durations = deque(maxlen=200)
+# Long-lived writer for memory/cache persistence. It is not owned by any event loop, so
+# run()'s private asyncio.run() returns without draining it; one worker keeps writes ordered.
+_persist_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agent-persist")
+
+
+def _adaptive_timeout() -> float:
+    """
+    Per-run timeout of max(MIN_AGENT_EXECUTION_TIME, 2 * p95 of recent runs), capped at
+    MAX_AGENT_EXECUTION_TIME, so one runaway run can't hold the Ollama slot for the full ceiling
+    when typical runs finish in seconds. Timed-out runs are recorded too, letting the timeout
+    grow back if too many runs hit it.
+    """
+    if len(_run_durations) < ADAPTIVE_TIMEOUT_MIN_SAMPLES:
+        return MAX_AGENT_EXECUTION_TIME
+    p95 = statistics.quantiles(_run_durations, n=20)[-1]
+    return min(MAX_AGENT_EXECUTION_TIME, max(MIN_AGENT_EXECUTION_TIME, 2 * p95))
+
+
+@dataclass(slots=True)
+class TraceStep:
+    """One executed tool call in an agent run (compact per-step record for the stream loop)."""
+    action: str
+    input: Any
+    observation: Any
+
+    def as_dict(self) -> dict:
+        # Shallow on purpose: dataclasses.asdict would deep-copy every observation
+        return {"action": self.action, "input": self.input, "observation": self.observation}
+
+
+def _run_sync(coro):
+    """
+    Runs a coroutine to completion from synchronous code. Inside a running event loop
+    (e.g. a sync helper called from an async endpoint) it runs on a private loop in a worker thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, coro).result()
+
+
+class _ParallelReActOutputParser(ReActSingleInputOutputParser):
+    """
+    ReAct output parser that also accepts several Action/Action Input pairs in one step.
+    Returning a list of actions lets AgentExecutor's async path run the tools concurrently
+    (asyncio.gather) and count the whole batch as a single iteration.
+    """
+
+    def parse(self, text: str) -> Union[AgentAction, List[AgentAction], AgentFinish]:
+        matches = list(ACTION_PAIR_REGEX.finditer(text))
+        if len(matches) < 2 or "Final Answer:" in text:
+            return super().parse(text)
+        actions = []
+        log_start = 0
+        for match in matches:
+            # Each action carries its own slice of the log so the scratchpad reads naturally
+            tool_input = match.group(2).strip(" ").strip('"')
+            actions.append(AgentAction(match.group(1).strip(), tool_input, text[log_start:match.end()]))
+            log_start = match.end()
+        return actions
+
+
+class _FenceTracker:
+    """
+    Counts ``` markers across streamed chunks without re-scanning the accumulated text.
+    Only the unmatched tail of the previous chunk (at most two characters) is carried over,
+    so a marker split across chunks is still found and scanning stays O(n) overall.
+    """
+
+    def __init__(self):
+        self.fences = 0
+        self._tail = ""
+
+    def feed(self, chunk: str) -> bool:
+        """Consumes a chunk; returns True once the first code block has been closed."""
+        window = self._tail + chunk
+        pos = window.find("```")
+        end = 0
+        while pos != -1:
+            self.fences += 1
+            end = pos + 3
+            pos = window.find("```", end)
+        self._tail = window[max(end, len(window) - 2):]
+        return self.fences >= 2
+
+
+class AgenticAIService:
+    """
+    A service for creating and running a ReAct agent with given tools and an Ollama LLM.
+    Automatically optimizes for speed by skipping the ReAct loop when zero or one tool is loaded.
+    """
+
+    def __init__(self, llm: BaseLanguageModel, tools: List[BaseTool], memory_service: ChromaMemoryService = None,
+                 verbose: bool = False, response_cache: SemanticCache = None, agent: Agent = None):
+        self.llm = llm
+        self.tools = tools or []
+        self.memory_service = memory_service
+        self.response_cache = response_cache
+        # Review/history Agent sharing this service's LLM client; created on first use unless injected
+        self.agent = agent
+        self.verbose = verbose
+
+        logger.info(f"Initializing agent with {len(self.tools)} tools.")
+        self.prompt = self._build_prompt()
+
+        # A single tool doesn't need ReAct planning: call it directly (see _arun_single_tool)
+        self._single_tool = self.tools[0] if len(self.tools) == 1 else None
+        # Only create the agent executor if there are several tools to choose from
+        self.agent_executor = self._get_agent_executor() if len(self.tools) > 1 else None
+
+    def _build_prompt(self) -> PromptTemplate:
+        """
+        Builds a robust prompt for the ReAct agent.
+        Matches LangChain's expected variables: {tools}, {tool_names}.
+        """
+        # Sorted so the prompt bytes don't depend on the order tools were loaded in
+        tools_key = tuple(sorted((tool.name, tool.description) for tool in self.tools))
+        tools_str, tool_names_str = _render_tools(tools_key)
         return PromptTemplate(
-            template=prompt_template.strip(),
+            template=REACT_PROMPT_TEMPLATE,
             input_variables=["input", "agent_scratchpad", "tools", "tool_names"],
             partial_variables={"tools": tools_str, "tool_names": tool_names_str}
         )
 
+    def _get_agent_executor(self) -> AgentExecutor:
+        """
+        Returns the process-wide executor for this LLM and tool set, building it on first use.
+        Prompt parsing and agent construction are paid once instead of per service instance.
+        """
+        key = (id(self.llm), frozenset(tool.name for tool in self.tools), self.verbose)
+        with _executor_cache_lock:
+            cached = _executor_cache.get(key)
+            if cached is not None:
+                _executor_cache.move_to_end(key)
+                return cached[1]
+            executor = self._create_agent_executor()
+            _executor_cache[key] = (self.llm, executor)
+            if len(_executor_cache) > EXECUTOR_CACHE_SIZE:
+                _executor_cache.popitem(last=False)
+            return executor
+
     def _create_agent_executor(self) -> AgentExecutor:
         """
         Creates a ReAct agent executor using the provided LLM, tools, and prompt.
@@ -78,7 +240,8 @@ Question: {input}
         agent = create_react_agent(
             llm=self.llm,
             tools=self.tools,
-            prompt=self.prompt
+            prompt=self.prompt,
+            output_parser=_ParallelReActOutputParser()
         )
 
         return AgentExecutor(
@@ -86,8 +249,8 @@ Question: {input}
             tools=self.tools,
             verbose=self.verbose,
             handle_parsing_errors=True,
-            max_iterations=MAX_AGENT_ITERATIONS,  # Keep iterations small for speed
-            max_execution_time=MAX_AGENT_EXECUTION_TIME  # Limit runtime to avoid long stalls
+            max_iterations=MAX_AGENT_ITERATIONS  # Keep iterations small for speed
+            # Runtime is bounded per run in arun() by _adaptive_timeout()
         )
 
     def _extract_code(self, text: str) -> str:
@@ -95,17 +258,74 @@ Question: {input}
         Extracts the first Python code block from markdown text,
         or returns the full text if no code block is found.
         """
-        matches = re.findall(CODE_BLOCK_REGEX, text, re.DOTALL)
-        if matches:
-            return matches[0].strip()
-        return text.strip()
+        match = CODE_BLOCK_REGEX.search(text)
+        return match.group(1).strip() if match else text.strip()
 
-    def run(self, query: str) -> dict:
+    async def _arun_single_tool(self, query: str) -> Tuple[str, list]:
+        """
+        One-tool flow: the LLM picks the tool input, the tool runs, the LLM writes the answer.
+        Returns (answer, step_trace).
+        """
+        tool = self._single_tool
+        input_prompt = SINGLE_TOOL_INPUT_TEMPLATE.format(tool_name=tool.name, tool_description=tool.description, input=query)
+        lines = str(await self.llm.ainvoke(input_prompt)).strip().splitlines()
+        tool_input = lines[0].strip().strip('"') if lines else query
+        observation = await tool.ainvoke(tool_input)
+        logger.info(f"[Agent Step] Action: {tool.name}, Input: {tool_input}, Observation: {observation}")
+        answer = await self.llm.ainvoke(SINGLE_TOOL_ANSWER_TEMPLATE.format(observation=observation, input=query))
+        return str(answer), [TraceStep(tool.name, tool_input, observation).as_dict()]
+
+    def _persist(self, query: str, memory: dict, code: str, cache_key: str, key_embedding):
+        """Writes the query/response to vector memory and the response cache."""
+        try:
+            if self.memory_service:
+                self.memory_service.add_memory(query, memory)
+            if self.response_cache:
+                self.response_cache.store(cache_key, code, key_embedding)
+        except Exception as e:
+            logger.error(f"Failed to persist agent memory: {e}", exc_info=True)
+
+    def _persist_in_background(self, query: str, memory: dict, code: str, cache_key: str, key_embedding):
+        """
+        Queues _persist on the process-wide persist worker so the caller gets the result
+        without waiting on Chroma, from arun() and from run() alike.
+        """
+        if not (self.memory_service or self.response_cache):
+            return
+        _persist_executor.submit(self._persist, query, memory, code, cache_key, key_embedding)
+
+    def _get_agent(self) -> Agent:
+        if self.agent is None:
+            self.agent = Agent(llm=self.llm)
+        return self.agent
+
+    def review(self, code: str) -> str:
+        """
+        Reviews code through the shared Agent, on the same LLM client as run().
+        """
+        return self._get_agent().review_code(code=code)
+
+    def history(self, limit: int = 10, offset: int = 0) -> dict:
+        """
+        Returns a page of agent history (Chroma get() result with documents and metadatas).
+        """
+        return self._get_agent().get_history(limit=limit, offset=offset)
+
+    def run(self, query: str, request_context: str = "") -> dict:
+        """
+        Synchronous entry point for arun(); safe to call with or without a running event loop.
+        """
+        return _run_sync(self.arun(query, request_context))
+
+    async def arun(self, query: str, request_context: str = "") -> dict:
         """
         Executes the agent against a user query, with timing logs and step-by-step trace logging.
-        Uses a direct LLM call if no tools are loaded to avoid ReAct overhead.
-        Persists each query/response in vector memory for context-aware, auditable flows.
-        Logs each agent step (Thought, Action, Observation) for traceability.
+        Serves repeated or near-identical queries (keyed on query + request_context) from the response cache.
+        Uses a direct, streamed LLM call if no tools are loaded, and a direct tool call if only
+        one is loaded, to avoid ReAct overhead.
+        Persists each query/response in vector memory in the background for context-aware, auditable flows.
+        Logs each agent step (Thought, Action, Observation) for traceability; independent
+        tool calls emitted in the same step are executed concurrently.
         Returns a structured error DTO if the agent stops due to limits, including the full reasoning trace.
         """
         try:
@@ -113,56 +333,99 @@ Question: {input}
             start_time = time.time()
             context = None
             step_trace = []
+            cache_key = SemanticCache.make_key(query, request_context)
+            key_embedding = None
+            # Serve repeated or near-identical queries from the response cache
+            if self.response_cache:
+                try:
+                    cached, key_embedding = self.response_cache.lookup(cache_key)
+                except Exception as e:
+                    # A cache outage must not take generation down with it
+                    logger.warning(f"Response cache lookup failed, calling the LLM: {e}")
+                    cached, key_embedding = None, None
+                if cached is not None:
+                    logger.info(f"Response cache hit in {time.time() - start_time:.2f} seconds — skipping LLM call.")
+                    return {"code": cached, "trace": step_trace, "model": getattr(self.llm, 'model_name', 'unknown')}
             # Retrieve relevant memory context for the query (RAG)
             if self.memory_service:
                 logger.info("Retrieving memory context for query...")
-                context = self.memory_service.get_memory(query)
+                try:
+                    context = self.memory_service.get_memory(query)
+                except Exception as e:
+                    logger.warning(f"Memory retrieval failed, continuing without context: {e}")
                 logger.info(f"Memory context: {context}")
 
+            # Single tool: direct tool call without the ReAct wrapper
+            if self._single_tool is not None:
+                logger.info(f"Single tool loaded — calling '{self._single_tool.name}' directly.")
+                answer, step_trace = await self._arun_single_tool(query)
+                logger.info(f"Single-tool run completed in {time.time() - start_time:.2f} seconds.")
+                code = self._extract_code(answer)
+                self._persist_in_background(query, {"output": code, "context": context, "trace": step_trace}, code, cache_key, key_embedding)
+                return {"code": code, "trace": step_trace, "model": getattr(self.llm, 'model_name', 'unknown')}
+
             # Fast-path: direct LLM call
             if not self.tools or not self.agent_executor:
                 logger.info("No tools loaded — using direct LLM call for speed.")
-                result = self.llm.invoke(query)
+                # Stream and stop as soon as the first code block closes; the rest is never used
+                chunks = []
+                fences = _FenceTracker()
+                async for chunk in self.llm.astream(query):
+                    text = chunk if isinstance(chunk, str) else str(chunk)
+                    chunks.append(text)
+                    if fences.feed(text):
+                        break
                 elapsed = time.time() - start_time
                 logger.info(f"Direct LLM call completed in {elapsed:.2f} seconds.")
-                text = result if isinstance(result, str) else str(result)
-                code = self._extract_code(text)
-                if self.memory_service:
-                    self.memory_service.add_memory(query, {"output": code, "context": context})
+                code = self._extract_code("".join(chunks))
+                self._persist_in_background(query, {"output": code, "context": context}, code, cache_key, key_embedding)
                 return {"code": code, "trace": step_trace, "model": getattr(self.llm, 'model_name', 'unknown')}
 
             # Standard ReAct agent execution with step-by-step logging
             agent_input = {"input": query}
             if context and isinstance(context, dict) and context.get("history"):
                 agent_input["history"] = context["history"]
-            try:
-                for step in self.agent_executor.stream(agent_input):
-                    if "intermediate_steps" in step:
-                        for s in step["intermediate_steps"]:
-                            action = getattr(s[0], "tool", None)
-                            action_input = getattr(s[0], "tool_input", None)
-                            observation = s[1]
-                            logger.info(f"[Agent Step] Action: {action}, Input: {action_input}, Observation: {observation}")
-                            step_trace.append({"action": action, "input": action_input, "observation": observation})
+            trace_steps: List[TraceStep] = []
+
+            async def _stream_steps():
+                async for step in self.agent_executor.astream(agent_input):
+                    for agent_step in step.get("steps", []):
+                        trace_step = TraceStep(agent_step.action.tool, agent_step.action.tool_input, agent_step.observation)
+                        logger.info(f"[Agent Step] Action: {trace_step.action}, Input: {trace_step.input}, Observation: {trace_step.observation}")
+                        trace_steps.append(trace_step)
                     if "output" in step:
-                        logger.info(f"[Agent Output] {step['output']}")
-                        output = step["output"]
-                        code = self._extract_code(output)
-                        if self.memory_service:
-                            self.memory_service.add_memory(query, {"output": code, "context": context, "trace": step_trace})
-                        return {"code": code, "trace": step_trace, "model": getattr(self.llm, 'model_name', 'unknown')}
+                        return step["output"]
+                return None
+
+            try:
+                timeout = _adaptive_timeout()
+                run_start = time.time()
+                try:
+                    output = await asyncio.wait_for(_stream_steps(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Agent exceeded adaptive timeout of {timeout:.1f} seconds.")
+                    output = None
+                _run_durations.append(time.time() - run_start)
+                if output == AGENT_STOPPED_OUTPUT:
+                    output = None
+                if output is not None:
+                    logger.info(f"[Agent Output] {output}")
+                    code = self._extract_code(output)
+                    step_trace = [trace_step.as_dict() for trace_step in trace_steps]
+                    self._persist_in_background(query, {"output": code, "context": context, "trace": step_trace}, code, cache_key, key_embedding)
+                    return {"code": code, "trace": step_trace, "model": getattr(self.llm, 'model_name', 'unknown')}
                 # If we exit the loop without returning, agent likely hit a limit
                 logger.warning("Agent stopped due to iteration or time limit. Returning partial trace.")
                 return {
                     "error": "Agent stopped due to iteration or time limit.",
-                    "trace": step_trace,
+                    "trace": [trace_step.as_dict() for trace_step in trace_steps],
                     "model": getattr(self.llm, 'model_name', 'unknown')
                 }
             except Exception as agent_exc:
                 logger.error(f"Agent execution failed: {agent_exc}", exc_info=True)
                 return {
                     "error": str(agent_exc),
-                    "trace": step_trace,
+                    "trace": [trace_step.as_dict() for trace_step in trace_steps],
                     "model": getattr(self.llm, 'model_name', 'unknown')
                 }
         except Exception as e:
@@ -1,24 +1,34 @@
 from langchain_community.agent_toolkits.load_tools import load_tools
 import logging
 from typing import List, Any
-from bs4 import BeautifulSoup
 import warnings
 
 logger = logging.getLogger(__name__)
 
-# Patch Wikipedia tool to always use 'lxml' parser and suppress parser warnings
-def _patched_bs4(*args, **kwargs):
-    kwargs.setdefault('features', 'lxml')
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        return _original_bs4(*args, **kwargs)
+_wikipedia_patched = False
+
+def _patch_wikipedia_parser():
+    """
+    Patches the Wikipedia tool to always use the 'lxml' parser and suppress parser warnings.
+    Imported and applied lazily, only when the wikipedia tool is actually loaded.
+    """
+    global _wikipedia_patched
+    if _wikipedia_patched:
+        return
+    try:
+        import wikipedia
+        from bs4 import BeautifulSoup
+    except ImportError:
+        return
+
+    def _patched_bs4(*args, **kwargs):
+        kwargs.setdefault('features', 'lxml')
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            return BeautifulSoup(*args, **kwargs)
 
-try:
-    import wikipedia
-    _original_bs4 = BeautifulSoup
     wikipedia.wikipedia.BeautifulSoup = _patched_bs4
-except ImportError:
-    pass
+    _wikipedia_patched = True
 
 def load_agent_tools(llm: Any, tool_names: List[str] = None):
     """
@@ -35,5 +45,7 @@ def load_agent_tools(llm: Any, tool_names: List[str] = None):
             # "arxiv",    # Uncomment if you want arXiv search
             # "terminal", # Uncomment if you want shell access
         ]
+    if "wikipedia" in tool_names:
+        _patch_wikipedia_parser()
     logger.info(f"Loading agent tools: {tool_names}")
     return load_tools(tool_names, llm=llm)
@@ -1,13 +1,36 @@
 import argparse
-from agent import Agent
-from dto.code_generation import CodeGenerationRequest, CodeGenerationResponse
-from dto.mcp import MCPContextRequest
-from mcp.mcp_service import MCPService
-import json
+from dto.code_generation import CodeGenerationRequest
+import orjson
+from pydantic import ValidationError
 import logging
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from agent import Agent
+    from agentic.agent_service import AgenticAIService
 
 logger = logging.getLogger("cli")
 
+@lru_cache(maxsize=None)
+def get_agent() -> "Agent":
+    """
+    Returns the process-wide Agent (LLM client + Chroma collection), created on first use.
+    The import is deferred so --help and argument errors don't load LangChain/Chroma.
+    """
+    from agent import Agent
+    return Agent()
+
+@lru_cache(maxsize=None)
+def get_agentic_service() -> "AgenticAIService":
+    """
+    Returns the AgenticAIService behind the mcp command, sharing the CLI Agent's LLM client
+    and response cache. No tools are loaded, so generation is a direct LLM call.
+    """
+    from agentic.agent_service import AgenticAIService
+    agent = get_agent()
+    return AgenticAIService(agent.llm, [], response_cache=agent.response_cache, agent=agent)
+
 def main():
     parser = argparse.ArgumentParser(description="Local-Agent CLI: Code generation and review via LLM")
     subparsers = parser.add_subparsers(dest="command", required=True)
@@ -27,12 +50,14 @@ def main():
     mcp_parser.add_argument("--payload", required=True, help="Context payload as JSON string")
 
     args = parser.parse_args()
-    agent = Agent()
 
     if args.command == "generate":
-        req = CodeGenerationRequest(task=args.task, context=args.context)
+        try:
+            req = CodeGenerationRequest(task=args.task, context=args.context)
+        except ValidationError as e:
+            parser.error(f"invalid --task: {e.errors()[0]['msg']}")
         logger.info(f"[CLI] Generating code for task: {req.task}")
-        code = agent.generate_code(task=req.task, context=req.context)
+        code = get_agent().generate_code(task=req.task, context=req.context)
         print("\nGenerated Code:\n" + code)
     elif args.command == "review":
         code_input = args.code
@@ -44,18 +69,21 @@ def main():
         except Exception as e:
             logger.warning(f"Could not read file: {e}. Using input as code string.")
         logger.info("[CLI] Reviewing code...")
-        review = agent.review_code(code=code_input)
+        review = get_agent().review_code(code=code_input)
         print("\nReview Result:\n" + review)
     elif args.command == "mcp":
+        from dto.mcp import MCPContextRequest
+        from mcp.mcp_service import MCPService
         try:
-            payload = json.loads(args.payload)
+            payload = orjson.loads(args.payload)
         except Exception as e:
             logger.error(f"Invalid JSON for payload: {e}")
             return
         req = MCPContextRequest(context_type=args.context_type, payload=payload)
-        service = MCPService()
+        service = MCPService(get_agentic_service())
         resp = service.handle_context(req)
-        print(f"\nMCP Response: {resp.json(indent=2)}")
+        # default=str: tool observations in agent traces aren't always JSON-native
+        print(f"\nMCP Response: {orjson.dumps(resp.model_dump(), option=orjson.OPT_INDENT_2, default=str).decode()}")
 
 if __name__ == "__main__":
     main()
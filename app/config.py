@@ -7,29 +7,42 @@ import os
 import logging
 
 # Structured logging setup
+# Logging configuration is owned by the application entrypoint; set LOCAL_AGENT_CONFIGURE_LOGGING=1
+# to attach a standalone handler when importing this module outside of one.
 logger = logging.getLogger("config")
 logger.setLevel(logging.INFO)
 
-if not logger.hasHandlers():
+if os.getenv("LOCAL_AGENT_CONFIGURE_LOGGING") == "1" and not logger.hasHandlers():
     handler = logging.StreamHandler()
     formatter = logging.Formatter('[%(asctime)s] %(levelname)s %(name)s: %(message)s')
     handler.setFormatter(formatter)
     logger.addHandler(handler)
-print("CONFIG LOADED: logging configured for 'config' logger")
 
 # Detect test environment and override model if needed
 # Enhanced logging for model selection
+# Defaults pin Q4_K_M quantized tags: decoding is memory-bandwidth bound, and ~4.5 bits/weight
+# moves ~3.5x fewer bytes per token than FP16 at near-identical code quality.
 if os.getenv("PYTEST_CURRENT_TEST") or not os.getenv("OLLAMA_MODEL"):
-    logger.info("[CONFIG] Detected test environment (PYTEST_CURRENT_TEST set) or OLLAMA_MODEL not set. Using lightweight model: 'qwen2.5-coder:0.5b' for OLLAMA_MODEL.")
-    MODEL_NAME = "qwen2.5-coder:0.5b"
+    logger.info("[CONFIG] Detected test environment (PYTEST_CURRENT_TEST set) or OLLAMA_MODEL not set. Using lightweight model: 'qwen2.5-coder:0.5b-instruct-q4_K_M' for OLLAMA_MODEL.")
+    MODEL_NAME = "qwen2.5-coder:0.5b-instruct-q4_K_M"
 else:
     MODEL_NAME = os.getenv("OLLAMA_MODEL")
     if not MODEL_NAME:
-        logger.warning("[CONFIG] OLLAMA_MODEL not set in environment; defaulting to 'codellama:7b'.")
-        MODEL_NAME = "codellama:7b"
+        logger.warning("[CONFIG] OLLAMA_MODEL not set in environment; defaulting to 'codellama:7b-code-q4_K_M'.")
+        MODEL_NAME = "codellama:7b-code-q4_K_M"
     else:
         logger.info(f"[CONFIG] Using OLLAMA_MODEL from environment: {MODEL_NAME}")
 
+# Context window sent with every Ollama request. Keep it identical for all clients: a
+# different num_ctx makes Ollama reload the model and drop its prompt (KV) cache.
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))
+
+# How long Ollama keeps the model loaded after a request (-1 = forever). The KV prompt cache only
+# survives while the model is loaded, so the default avoids the 5-minute idle unload.
+# Plain integers are seconds; otherwise a duration string such as '24h'.
+_keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "-1")
+OLLAMA_KEEP_ALIVE = int(_keep_alive) if _keep_alive.lstrip("-").isdigit() else _keep_alive
+
 # Ollama service configuration
 OLLAMA_HOST = os.getenv("OLLAMA_HOST")
 if not OLLAMA_HOST:
@@ -45,3 +58,33 @@ if not CHROMA_COLLECTION:
     CHROMA_COLLECTION = "agent_history"
 else:
     logger.info(f"Using CHROMA_COLLECTION: {CHROMA_COLLECTION}")
+
+# ChromaDB storage directory (history survives restarts and is shared by all Agents in a process)
+CHROMA_PATH = os.getenv("CHROMA_PATH")
+if not CHROMA_PATH:
+    logger.info("CHROMA_PATH not set in environment; defaulting to './.chroma'.")
+    CHROMA_PATH = "./.chroma"
+else:
+    logger.info(f"Using CHROMA_PATH: {CHROMA_PATH}")
+
+# Optional Chroma server (e.g. the 'chroma' docker-compose service). When set, Chroma is used over
+# HTTP so the vector index lives in the server process instead of the API's heap; otherwise it is embedded.
+CHROMA_HOST = os.getenv("CHROMA_HOST")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+if CHROMA_HOST:
+    logger.info(f"Using Chroma server at {CHROMA_HOST}:{CHROMA_PORT}")
+
+# Embedding model for the semantic response cache (e.g. 'nomic-embed-text'); defaults to MODEL_NAME
+EMBEDDING_MODEL = os.getenv("OLLAMA_EMBEDDING_MODEL")
+if not EMBEDDING_MODEL:
+    logger.info(f"OLLAMA_EMBEDDING_MODEL not set in environment; using '{MODEL_NAME}' for embeddings.")
+    EMBEDDING_MODEL = MODEL_NAME
+else:
+    logger.info(f"Using OLLAMA_EMBEDDING_MODEL: {EMBEDDING_MODEL}")
+
+# Near-duplicate (semantic) cache hits need a real embedding model: a generation model's embeddings
+# rate unrelated prompts as similar. Without OLLAMA_EMBEDDING_MODEL the response cache is exact-match only.
+SEMANTIC_CACHE_ENABLED = bool(os.getenv("OLLAMA_EMBEDDING_MODEL"))
+
+# Maximum cosine distance for a cached LLM response to be reused (0.05 ~= 0.95 similarity)
+SEMANTIC_CACHE_MAX_DISTANCE = float(os.getenv("SEMANTIC_CACHE_MAX_DISTANCE", "0.05"))
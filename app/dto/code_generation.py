@@ -1,10 +1,19 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from typing import Optional, List, Dict
 
 class CodeGenerationRequest(BaseModel):
     task: str
     context: str = ""
 
+    @field_validator("task")
+    @classmethod
+    def _task_not_blank(cls, v: str) -> str:
+        # Rejected while parsing (422), before any handler, logging or agent work
+        v = v.strip()
+        if not v:
+            raise ValueError("task must not be empty")
+        return v
+
 class CodeGenerationResponse(BaseModel):
     code: str
     model: Optional[str] = None
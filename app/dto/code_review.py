@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+
+class CodeReviewRequest(BaseModel):
+    code: str
+
+class CodeReviewResponse(BaseModel):
+    review: str
+    model: str
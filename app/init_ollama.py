@@ -1,3 +1,5 @@
+import asyncio
+import httpx
 import requests
 import time
 from config import OLLAMA_HOST, MODEL_NAME
@@ -27,6 +29,30 @@ def wait_for_ollama():
     print("Failed to connect to Ollama service or model not available after maximum retries")
     return False
 
+async def wait_for_ollama_async(client: httpx.AsyncClient, timeout: float = 150.0) -> bool:
+    """
+    Async variant of wait_for_ollama for app startup: polls over the caller's keep-alive client
+    with exponential backoff (0.1s doubling up to 5s) so other startup work can run meanwhile.
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.1
+    while True:
+        try:
+            response = await client.get(f"{OLLAMA_HOST}/api/tags")
+            if response.status_code == 200:
+                models = response.json().get('models', [])
+                if any(model.get('name') == MODEL_NAME for model in models):
+                    print(f"Model {MODEL_NAME} is ready!")
+                    return True
+                print(f"Waiting for {MODEL_NAME} model to be available... (retrying in {delay:.1f}s)")
+        except httpx.TransportError:
+            print(f"Waiting for Ollama service to start... (retrying in {delay:.1f}s)")
+        if time.monotonic() + delay > deadline:
+            print("Failed to connect to Ollama service or model not available before timeout")
+            return False
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 5.0)
+
 if __name__ == "__main__":
     if not wait_for_ollama():
         print("Failed to initialize Ollama service")
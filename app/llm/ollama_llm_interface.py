@@ -1,18 +1,65 @@
 import os
 import logging
+from functools import lru_cache
+from typing import List, Optional, Union
+import httpx
 from langchain_community.llms import Ollama  # Updated import
 from langchain_community.embeddings import OllamaEmbeddings
+from config import MODEL_NAME, OLLAMA_NUM_CTX, OLLAMA_KEEP_ALIVE, OLLAMA_HOST, EMBEDDING_MODEL
 
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=1)
+def _embedding_http_client() -> httpx.Client:
+    """Keep-alive connection pool shared by every embedding request to Ollama."""
+    return httpx.Client(limits=httpx.Limits(max_keepalive_connections=32, max_connections=64), timeout=None)
+
+class PooledOllamaEmbeddings(OllamaEmbeddings):
+    """
+    OllamaEmbeddings that embeds a whole list of texts in one /api/embed request, over the shared
+    pooled httpx client; the base class sends one /api/embeddings request per text on a new
+    TCP connection. /api/embed returns unit-length vectors, which leaves cosine distances unchanged.
+    Every request carries keep_alive: Ollama resets a loaded model's expiry on each request, so an
+    embedding call without it would unload a shared generation model after the default 5 minutes.
+    """
+    keep_alive: Optional[Union[int, str]] = None
+
+    def _embed(self, input: List[str]) -> List[List[float]]:
+        if not input:
+            return []
+        payload = {**self._default_params, "input": input}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        try:
+            res = _embedding_http_client().post(
+                f"{self.base_url}/api/embed",
+                headers={"Content-Type": "application/json", **(self.headers or {})},
+                json=payload,
+            )
+        except httpx.HTTPError as e:
+            raise ValueError(f"Error raised by inference endpoint: {e}")
+        if res.status_code != 200:
+            raise ValueError(f"Error raised by inference API HTTP code: {res.status_code}, {res.text}")
+        return res.json()["embeddings"]
+
+@lru_cache(maxsize=None)
+def get_embeddings(model: str = EMBEDDING_MODEL, base_url: str = OLLAMA_HOST) -> PooledOllamaEmbeddings:
+    """
+    Process-wide embeddings client per model and host, shared by Agent and the memory service.
+    Uses the generation client's num_ctx and keep_alive, so when both use the same model neither
+    request makes Ollama reload it (and drop the KV prompt cache).
+    """
+    return PooledOllamaEmbeddings(model=model, base_url=base_url, num_ctx=OLLAMA_NUM_CTX, keep_alive=OLLAMA_KEEP_ALIVE)
+
 class OllamaLLMInterface:
     """
     Encapsulates the initialization and configuration of the local Ollama LLM interface.
     Promotes abstraction and testability for agentic workflows.
     """
     def __init__(self, model_name: str = None, temperature: float = 0.7):
-        # Prefer model name from environment variable, fallback to argument, then default
-        self.model_name = os.getenv("OLLAMA_MODEL") or model_name or "llama3"
+        # Prefer model name from environment variable, fallback to argument, then the config default.
+        # The config default is a Q4_K_M quantized tag; set OLLAMA_MODEL to use another tag/quantization.
+        self.model_name = os.getenv("OLLAMA_MODEL") or model_name or MODEL_NAME
         self.temperature = temperature
         logger.info(f"Initializing Ollama LLM with model: {self.model_name}")
         self.llm = self._init_llm()
@@ -20,7 +67,9 @@ class OllamaLLMInterface:
     def _init_llm(self):
         """Initializes and returns the Ollama LLM instance."""
         ollama_host = os.getenv("OLLAMA_HOST", "http://ollama:11434")
-        return Ollama(model=self.model_name, temperature=self.temperature, base_url=ollama_host)
+        # Fixed num_ctx and keep_alive keep the model loaded with the same context so prompt prefixes hit the KV cache
+        return Ollama(model=self.model_name, temperature=self.temperature, base_url=ollama_host,
+                      num_ctx=OLLAMA_NUM_CTX, keep_alive=OLLAMA_KEEP_ALIVE)
 
     def get_llm(self):
         """Returns the underlying Ollama LLM instance for agent use."""
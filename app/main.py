@@ -1,38 +1,86 @@
-from fastapi import FastAPI, UploadFile, File, Body, HTTPException
+from fastapi import FastAPI, UploadFile, File, Body, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+import anyio
+import asyncio
+import atexit
+import hashlib
+import httpx
 import os
 from pathlib import Path
-from init_ollama import wait_for_ollama
+from collections import OrderedDict
+from init_ollama import wait_for_ollama_async
 from contextlib import asynccontextmanager
 from dto.code_generation import CodeGenerationRequest, CodeGenerationResponse
+from dto.code_review import CodeReviewRequest, CodeReviewResponse
 from agent import Agent
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from typing import List
-from pydantic import BaseModel
 from llm.ollama_llm_interface import OllamaLLMInterface
 from agentic.tools_loader import load_agent_tools
 from agentic.agent_service import AgenticAIService
 from memory.chroma_memory_service import ChromaMemoryService
+from memory.semantic_cache import SemanticCache
 import time
 from dto.mcp import MCPContextRequest, MCPContextResponse
 from mcp.mcp_service import MCPService
-from fastapi import Body
 
 # Create documents directory if it doesn't exist
 DOCUMENTS_DIR = Path("/app/documents")
 DOCUMENTS_DIR.mkdir(exist_ok=True)
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+async def _gather_or_cancel(*aws):
+    """
+    asyncio.gather that cancels the other awaitables as soon as one fails, then re-raises,
+    so e.g. the Ollama poller doesn't outlive its HTTP client when a service fails to start.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan event handler for FastAPI"""
-    # Startup
-    if not wait_for_ollama():
+    # Startup: wait for Ollama while tools and the Chroma-backed services initialize in worker threads
+    global tools, memory_service, response_cache, agentic_service, mcp_service
+    async with httpx.AsyncClient() as client:
+        ollama_ready, tools, memory_service, agent = await _gather_or_cancel(
+            wait_for_ollama_async(client),
+            asyncio.to_thread(load_agent_tools, llm),
+            asyncio.to_thread(ChromaMemoryService),
+            asyncio.to_thread(Agent, llm),
+        )
+    if not ollama_ready:
         raise Exception("Failed to initialize Ollama service")
+    # Semantic response cache in front of the agent: the Agent's cache on the shared persistent Chroma
+    # client, so it survives restarts and is the same store the CLI's Agent uses
+    response_cache = agent.response_cache
+    # AgenticAIService is shared by all requests (generate, review, history, MCP), with memory,
+    # the response cache and the review/history Agent injected; everything uses the one LLM client
+    agentic_service = AgenticAIService(llm, tools, memory_service=memory_service, response_cache=response_cache, agent=agent)
+    # MCPService orchestrates through the same AgenticAIService
+    mcp_service = MCPService(agentic_service)
+    # Embedding model warm-up: Ollama loads the model on first use, so pay that here rather than on
+    # the first request's cache lookup. The vector itself is discarded.
+    try:
+        await run_in_threadpool(memory_service.embeddings.embed_query, "warm-up")
+    except Exception as e:
+        logger.warning("Embedding model warm-up failed: %s", e)
     yield
-    # Shutdown
-    pass
+    # Shutdown: write any buffered agent memories
+    memory_service.flush()
 
-app = FastAPI(title="Local Support Bot", lifespan=lifespan)
+# orjson serializes every response, not just /history
+app = FastAPI(title="Local Support Bot", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Configure CORS
 app.add_middleware(
@@ -44,7 +92,12 @@ app.add_middleware(
 )
 
 logger = logging.getLogger("api")
-logging.basicConfig(level=logging.INFO)  # Ensure root logger is configured
+# Root logger only enqueues records; a listener thread writes them to stderr, keeping stream I/O off the event loop
+_log_queue = queue.SimpleQueue()
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(_log_queue)])
+_log_listener = QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+atexit.register(_log_listener.stop)  # drain queued records on exit
 
 @app.get("/")
 async def root():
@@ -56,110 +109,136 @@ async def upload_document(file: UploadFile = File(...)):
     Upload a document to be processed and embedded
     """
     file_path = DOCUMENTS_DIR / file.filename
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+    # Copy in fixed-size chunks so memory stays bounded and disk writes don't block the event loop
+    async with await anyio.open_file(file_path, "wb") as buffer:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await buffer.write(chunk)
     return {"filename": file.filename, "status": "uploaded"}
 
-# Initialize LLM and tools once for the app
+# Initialize the LLM client once for the app (no network until first use)
 llm_interface = OllamaLLMInterface()
 llm = llm_interface.get_llm()
-tools = load_agent_tools(llm)
 
-# Initialize ChromaMemoryService once for the app
-memory_service = ChromaMemoryService()
+# Tools, memory, caches and agents are created once in lifespan startup, concurrently with the Ollama wait
+tools = None
+memory_service: ChromaMemoryService = None
+response_cache: SemanticCache = None
+agentic_service: AgenticAIService = None
+mcp_service: MCPService = None
 
-# Initialize AgenticAIService once at startup, injecting memory
-agentic_service = AgenticAIService(llm, tools, memory_service=memory_service)
+# Bound concurrent blocking LLM/Chroma work so Ollama isn't oversubscribed while the event loop stays free
+AGENT_CONCURRENCY = int(os.getenv("AGENT_CONCURRENCY", "4"))
+SEM = asyncio.Semaphore(AGENT_CONCURRENCY)
+
+def _to_response(result) -> CodeGenerationResponse:
+    """Maps an agentic_service.run result (dict or plain string) to the API response DTO."""
+    if isinstance(result, dict):
+        return CodeGenerationResponse(
+            code=result.get("code") or result.get("error") or "",
+            model=result.get("model", llm_interface.model_name),
+            error=result.get("error"),
+            trace=result.get("trace")
+        )
+    return CodeGenerationResponse(code=result, model=llm_interface.model_name)
+
+# Exact-match layer in front of the semantic cache: byte-identical (task, context) retries are answered
+# from process memory without embedding or taking a concurrency slot. Event-loop only, so no lock.
+EXACT_CACHE_SIZE = 4096
+_exact_cache: "OrderedDict[str, CodeGenerationResponse]" = OrderedDict()
+
+def _exact_key(request: CodeGenerationRequest) -> str:
+    return hashlib.sha256(f"{request.task}\x00{request.context or ''}".encode("utf-8")).hexdigest()
+
+async def _run_generation(request: CodeGenerationRequest) -> CodeGenerationResponse:
+    """Runs the agent for one request under the concurrency limit, serving exact repeats from _exact_cache."""
+    key = _exact_key(request)
+    cached = _exact_cache.get(key)
+    if cached is not None:
+        _exact_cache.move_to_end(key)
+        logger.info("Exact cache hit for task='%s'", request.task)
+        return cached
+    async with SEM:
+        response = _to_response(await run_in_threadpool(agentic_service.run, request.task, request.context))
+    if response.error is None:
+        _exact_cache[key] = response
+        if len(_exact_cache) > EXACT_CACHE_SIZE:
+            _exact_cache.popitem(last=False)
+    return response
 
 @app.post("/generate", response_model=CodeGenerationResponse)
 async def generate_code(request: CodeGenerationRequest = Body(...)):
     """
     Generate code for a given task using the AgenticAIService (LLM + tools).
     """
-    logger.info(f"Received code generation request: task='{request.task}'")
-    if not request.task or not request.task.strip():
-        logger.info("Empty task received, returning empty code response.")
-        return CodeGenerationResponse(code="", model="")
+    logger.info("Received code generation request: task='%s'", request.task)
     logger.info("Starting code generation processing...")
     start_time = time.time()
     logger.info("AgenticAIService initialized. Invoking agent...")
-    result = agentic_service.run(request.task)
+    response = await _run_generation(request)
     elapsed = time.time() - start_time
-    logger.info(f"Code generation complete. Task='{request.task}' Elapsed={elapsed:.2f}s")
-    # Handle both string and dict results from agentic_service.run
-    if isinstance(result, dict):
-        return CodeGenerationResponse(
-            code=result.get("code") or result.get("error") or "",
-            model=result.get("model", llm_interface.model_name),
-            error=result.get("error"),
-            trace=result.get("trace")
-        )
-    else:
-        return CodeGenerationResponse(code=result, model=llm_interface.model_name)
-
-class CodeReviewRequest(BaseModel):
-    code: str
+    logger.info("Code generation complete. Task='%s' Elapsed=%.2fs", request.task, elapsed)
+    return response
 
-class CodeReviewResponse(BaseModel):
-    review: str
-    model: str
-
-class AgentHistoryItem(BaseModel):
-    document: str
-    metadata: dict
+@app.post("/generate/batch", response_model=List[CodeGenerationResponse])
+async def generate_code_batch(requests: List[CodeGenerationRequest] = Body(...)):
+    """
+    Generate code for several tasks concurrently; results are returned in request order.
+    Concurrency is bounded by the shared AGENT_CONCURRENCY semaphore.
+    """
+    logger.info("Received batch code generation request: %d tasks", len(requests))
+    start_time = time.time()
 
-class AgentHistoryResponse(BaseModel):
-    history: List[AgentHistoryItem]
+    responses = await asyncio.gather(*(_run_generation(request) for request in requests))
+    logger.info("Batch code generation complete. Tasks=%d Elapsed=%.2fs", len(requests), time.time() - start_time)
+    return responses
 
 @app.post("/review", response_model=CodeReviewResponse)
 async def review_code(request: CodeReviewRequest = Body(...)):
     """
-    Review code for quality, bugs, and improvements using the Agent.
+    Review code for quality, bugs, and improvements using the AgenticAIService.
     """
     logger.info("Received code review request.")
     try:
-        agent = Agent()
-        review = agent.review_code(code=request.code)
+        async with SEM:
+            review = await run_in_threadpool(agentic_service.review, request.code)
         logger.info("Code review complete.")
         return CodeReviewResponse(review=review, model="")
     except Exception as e:
-        logger.error(f"Error during code review: {e}")
+        logger.error("Error during code review: %s", e)
         raise HTTPException(status_code=500, detail="Code review failed.")
 
-@app.get("/history", response_model=AgentHistoryResponse)
-async def get_agent_history(limit: int = 10):
+@app.get("/history", response_model=None)
+async def get_agent_history(limit: int = Query(10, ge=1), offset: int = Query(0, ge=0)):
     """
-    Retrieve recent agent history from vector DB.
+    Retrieve recent agent history from vector DB; page with limit/offset.
     """
-    logger.info(f"Fetching agent history, limit={limit}")
+    logger.info("Fetching agent history, limit=%d offset=%d", limit, offset)
     try:
-        agent = Agent()
-        results = agent.get_history(limit=limit)
-        # Format results for response
-        history = [AgentHistoryItem(document=doc, metadata=meta)
-                   for doc, meta in zip(results.get('documents', []), results.get('metadatas', []))]
-        return AgentHistoryResponse(history=history)
+        # A Chroma read, no LLM call: not counted against the agent concurrency limit
+        results = await run_in_threadpool(agentic_service.history, limit=limit, offset=offset)
+        # Plain dicts serialized by orjson: no per-item Pydantic validation
+        documents = results.get('documents', [])
+        metadatas = results.get('metadatas', [])
+        return {"history": [{"document": doc, "metadata": meta} for doc, meta in zip(documents, metadatas)]}
     except Exception as e:
-        logger.error(f"Error fetching agent history: {e}")
+        logger.error("Error fetching agent history: %s", e)
         raise HTTPException(status_code=500, detail="Failed to fetch agent history.")
 
-# Initialize MCPService with AgenticAIService for orchestration
-mcp_service = MCPService(agentic_service)
-
 @app.post("/mcp", response_model=MCPContextResponse, tags=["MCP"])
 async def mcp_context(request: MCPContextRequest = Body(...)):
     """
     Handle Model Context Protocol (MCP) context requests.
     Supports orchestration of code generation and other agentic flows.
     """
-    logger.info(f"Received MCP context request: type='{request.context_type}'")
+    logger.info("Received MCP context request: type='%s'", request.context_type)
     try:
-        response = mcp_service.handle_context(request)
+        # handle_context may run the agent synchronously: keep it off the event loop and under the limit
+        async with SEM:
+            response = await run_in_threadpool(mcp_service.handle_context, request)
         logger.info("MCP context processed successfully.")
         return response
     except Exception as e:
-        logger.error(f"MCP context processing failed: {e}")
+        logger.error("MCP context processing failed: %s", e)
         return MCPContextResponse(status="error", data={"error": str(e)})
 
 if __name__ == "__main__":
@@ -13,7 +13,7 @@ class MCPService:
             task = request.payload.get("task")
             if not task:
                 return MCPContextResponse(status="error", data={"error": "Missing 'task' in payload"})
-            logger.info(f"MCPService: Generating code for task: {task}")
+            logger.info("MCPService: Generating code for task: %s", task)
             result = self.agentic_service.run(task)
             return MCPContextResponse(status="ok", data={"result": result})
         # For demo: just echo the payload with a status
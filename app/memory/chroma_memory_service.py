@@ -1,9 +1,20 @@
+import logging
 import os
-from chromadb import Client as ChromaClient
+import threading
+import uuid
+from typing import List
+from chromadb import Client as ChromaClient, HttpClient
 from chromadb.config import Settings
-from langchain.memory import VectorStoreRetrieverMemory
-from langchain_chroma import Chroma  # Updated import as per deprecation warning
-from langchain_community.embeddings import OllamaEmbeddings
+from config import CHROMA_HOST, CHROMA_PORT
+from llm.ollama_llm_interface import get_embeddings
+
+logger = logging.getLogger(__name__)
+
+# Memory writes are buffered and flushed as one batch when either limit is reached
+MEMORY_FLUSH_SIZE = 100
+MEMORY_FLUSH_INTERVAL = 0.5  # seconds
+# Rows deleted per Chroma call when clearing memory
+MEMORY_CLEAR_BATCH_SIZE = 1000
 
 class ChromaMemoryService:
     """
@@ -13,38 +24,91 @@ class ChromaMemoryService:
     def __init__(self, persist_directory: str = "/app/documents/chroma_memory"):
         self.persist_directory = persist_directory
         os.makedirs(self.persist_directory, exist_ok=True)
-        self.chroma_client = ChromaClient(Settings(persist_directory=self.persist_directory))
+        if CHROMA_HOST:
+            # Server mode: the vector index and its writes live in the Chroma container, not this process
+            self.chroma_client = HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+        else:
+            self.chroma_client = ChromaClient(Settings(persist_directory=self.persist_directory))
         self.collection_name = "agent_memory"
-        ollama_host = os.getenv("OLLAMA_HOST", "http://ollama:11434")
-        ollama_model = os.getenv("OLLAMA_MODEL", "qwen2.5-coder:0.5b")
-        self.vectorstore = Chroma(
-            client=self.chroma_client,
-            collection_name=self.collection_name,
-            embedding_function=OllamaEmbeddings(base_url=ollama_host, model=ollama_model)
+        # Shared pooled embeddings client (same instance as Agent's for the same model and host)
+        self.embeddings = get_embeddings()
+        # Reads and writes go straight to the collection, skipping LangChain's retriever/memory layers
+        # Cosine space: /api/embed returns unit-length vectors, and cosine ranks them the same way for
+        # reads and writes. Only applies when the collection is created.
+        self._collection = self.chroma_client.get_or_create_collection(
+            self.collection_name, metadata={"hnsw:space": "cosine"}
         )
-        self.memory = VectorStoreRetrieverMemory(
-            retriever=self.vectorstore.as_retriever(),
-            memory_key="history",
-            input_key="input"
+        self._buf: List[str] = []
+        self._buf_lock = threading.Lock()
+        self._flush_timer = None
+
+    @staticmethod
+    def _format_memory(input_text: str, metadata: dict) -> str:
+        """Same document text VectorStoreRetrieverMemory.save_context would store."""
+        return "\n".join(f"{k}: {v}" for k, v in [("input", input_text), *metadata.items()])
+
+    def _take_buffer(self) -> List[str]:
+        """Empties the write buffer and cancels the pending timed flush. Call with _buf_lock held."""
+        texts, self._buf = self._buf, []
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        return texts
+
+    def _write(self, texts: List[str]):
+        """Embeds a batch of memory texts in one /api/embed request and adds them with one Chroma write."""
+        embeddings = self.embeddings.embed_documents(texts)
+        self._collection.add(
+            ids=[str(uuid.uuid4()) for _ in texts],
+            embeddings=embeddings,
+            documents=texts
         )
 
     def add_memory(self, input_text: str, metadata: dict = None):
-        self.memory.save_context({"input": input_text}, metadata or {})
+        """
+        Buffers a memory write; the buffer is flushed to Chroma in one batch once it holds
+        MEMORY_FLUSH_SIZE items or MEMORY_FLUSH_INTERVAL seconds after the first buffered write.
+        """
+        with self._buf_lock:
+            self._buf.append(self._format_memory(input_text, metadata or {}))
+            if len(self._buf) < MEMORY_FLUSH_SIZE:
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(MEMORY_FLUSH_INTERVAL, self._timed_flush)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+                return
+            texts = self._take_buffer()
+        self._write(texts)
+
+    def flush(self):
+        """Writes all buffered memories to Chroma; call on shutdown."""
+        with self._buf_lock:
+            texts = self._take_buffer()
+        if texts:
+            self._write(texts)
+
+    def _timed_flush(self):
+        """Timer-thread flush: nobody is waiting on it to see an exception, so failures are logged."""
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush buffered agent memories: {e}", exc_info=True)
 
     def get_memory(self, query: str, k: int = 5):
-        return self.memory.load_memory_variables({"input": query})
+        """
+        Returns {"history": ...} with the k memories nearest to the query, one per line
+        (the shape VectorStoreRetrieverMemory.load_memory_variables returned).
+        """
+        query_embedding = self.embeddings.embed_query(query)
+        results = self._collection.query(query_embeddings=[query_embedding], n_results=k, include=["documents"])
+        return {"history": "\n".join(results["documents"][0])}
 
     def clear_memory(self):
-        self.vectorstore.delete_collection(self.collection_name)
-        ollama_host = os.getenv("OLLAMA_HOST", "http://ollama:11434")
-        ollama_model = os.getenv("OLLAMA_MODEL", "qwen2.5-coder:0.5b")
-        self.vectorstore = Chroma(
-            client=self.chroma_client,
-            collection_name=self.collection_name,
-            embedding_function=OllamaEmbeddings(base_url=ollama_host, model=ollama_model)
-        )
-        self.memory = VectorStoreRetrieverMemory(
-            retriever=self.vectorstore.as_retriever(),
-            memory_key="history",
-            input_key="input"
-        )
+        """
+        Deletes all stored memories in place, keeping the collection, its index configuration
+        and the embedding client instead of dropping and rebuilding them.
+        """
+        with self._buf_lock:
+            self._take_buffer()
+        while ids := self._collection.get(limit=MEMORY_CLEAR_BATCH_SIZE, include=[])["ids"]:
+            self._collection.delete(ids=ids)
@@ -0,0 +1,66 @@
+import hashlib
+from typing import Dict, List, Optional, Tuple
+from config import SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_MAX_DISTANCE
+
+class SemanticCache:
+    """
+    Response cache in front of the LLM, backed by a Chroma collection in cosine space.
+    A lookup is an exact match on the key hash first, then (if semantic) the nearest
+    stored key whose cosine similarity is at least similarity_threshold. semantic defaults to
+    SEMANTIC_CACHE_ENABLED, i.e. on only when a dedicated embedding model is configured.
+    """
+    def __init__(self, chroma_client, embeddings, collection_name: str = "agent_response_cache",
+                 similarity_threshold: float = 1.0 - SEMANTIC_CACHE_MAX_DISTANCE, semantic: Optional[bool] = None):
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.semantic = SEMANTIC_CACHE_ENABLED if semantic is None else semantic
+        self.collection = chroma_client.get_or_create_collection(
+            collection_name, metadata={"hnsw:space": "cosine"}
+        )
+
+    @staticmethod
+    def make_key(task: str, context: str = "") -> str:
+        """
+        Cache key for a task and its optional request context. NUL-separated like agent._doc_id,
+        so ("a\nb", "") and ("a", "b") get different keys.
+        """
+        return f"{task}\x00{context}" if context else task
+
+    @staticmethod
+    def _key_id(key: str) -> str:
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+    def entry(self, key: str, response: str) -> Tuple[str, Dict[str, str], str]:
+        """(document, metadata, id) stored for a key; lets callers queue the write elsewhere."""
+        return key, {"response": response}, self._key_id(key)
+
+    def lookup(self, key: str, semantic: bool = True) -> Tuple[Optional[str], Optional[List[float]]]:
+        """
+        Returns (response, key_embedding). The embedding is None on an exact hit, or when
+        the lookup is exact-match only (semantic=False here or on the cache); otherwise it should
+        be passed to store() on a miss so the key is embedded only once.
+        """
+        hit = self.collection.get(ids=[self._key_id(key)], include=["metadatas"])
+        if hit["ids"]:
+            return hit["metadatas"][0]["response"], None
+        if not (semantic and self.semantic):
+            return None, None
+        embedding = self.embeddings.embed_query(key)
+        results = self.collection.query(
+            query_embeddings=[embedding], n_results=1, include=["metadatas", "distances"]
+        )
+        distances = results["distances"][0]
+        # Chroma's cosine distance is 1 - cosine similarity
+        if distances and 1.0 - distances[0] >= self.similarity_threshold:
+            return results["metadatas"][0][0]["response"], embedding
+        return None, embedding
+
+    def store(self, key: str, response: str, embedding: Optional[List[float]] = None):
+        """Stores the final response for the key."""
+        document, metadata, doc_id = self.entry(key, response)
+        self.collection.upsert(
+            ids=[doc_id],
+            documents=[document],
+            metadatas=[metadata],
+            embeddings=[embedding if embedding is not None else self.embeddings.embed_query(key)]
+        )
@@ -2,42 +2,51 @@ import pytest
 from unittest.mock import patch, MagicMock
 from app.agent import Agent
 
+def _empty_collection():
+    """Mock Chroma collection with no stored documents (cache miss on every lookup)."""
+    collection = MagicMock()
+    collection.get.return_value = {"ids": [], "documents": [], "metadatas": []}
+    collection.query.return_value = {"ids": [[]], "documents": [[]], "distances": [[]]}
+    return collection
+
 def test_agent_instantiation():
     agent = Agent()
     assert agent.llm is not None
     assert agent.collection is not None
 
+@patch("app.agent._embedder")
 @patch("app.agent.Ollama")
-@patch("app.agent.chromadb.Client")
-def test_generate_code(mock_chroma_client, mock_ollama):
+@patch("app.agent._chroma_client")
+def test_generate_code(mock_chroma_client, mock_ollama, mock_embeddings):
     mock_llm = MagicMock()
     mock_chain = MagicMock()
     mock_chain.run.return_value = "def foo(): pass"
     mock_ollama.return_value = mock_llm
     mock_chroma = MagicMock()
-    mock_chroma.get_or_create_collection.return_value = MagicMock()
+    mock_chroma.get_or_create_collection.return_value = _empty_collection()
     mock_chroma_client.return_value = mock_chroma
     with patch("app.agent.LLMChain", return_value=mock_chain):
         agent = Agent()
         result = agent.generate_code("Write a Python function")
         assert "def foo" in result
 
+@patch("app.agent._embedder")
 @patch("app.agent.Ollama")
-@patch("app.agent.chromadb.Client")
-def test_review_code(mock_chroma_client, mock_ollama):
+@patch("app.agent._chroma_client")
+def test_review_code(mock_chroma_client, mock_ollama, mock_embeddings):
     mock_llm = MagicMock()
     mock_chain = MagicMock()
     mock_chain.run.return_value = "Looks good, but add error handling."
     mock_ollama.return_value = mock_llm
     mock_chroma = MagicMock()
-    mock_chroma.get_or_create_collection.return_value = MagicMock()
+    mock_chroma.get_or_create_collection.return_value = _empty_collection()
     mock_chroma_client.return_value = mock_chroma
     with patch("app.agent.LLMChain", return_value=mock_chain):
         agent = Agent()
         result = agent.review_code("def foo(): pass")
         assert "error handling" in result
 
-@patch("app.agent.chromadb.Client")
+@patch("app.agent._chroma_client")
 def test_get_history(mock_chroma_client):
     mock_chroma = MagicMock()
     mock_chroma.get_or_create_collection.return_value.get.return_value = {
@@ -50,54 +59,66 @@ def test_get_history(mock_chroma_client):
     history = agent.get_history(limit=2)
     assert len(history["documents"]) == 2
 
+@patch("app.agent._chroma_client")
+def test_get_history_pushes_paging_to_chroma(mock_chroma_client):
+    collection = _empty_collection()
+    mock_chroma_client.return_value.get_or_create_collection.return_value = collection
+    agent = Agent()
+    agent.get_history(limit=5, offset=10)
+    collection.get.assert_called_once_with(limit=5, offset=10, include=["documents", "metadatas"])
+
+@patch("app.agent._embedder")
 @patch("app.agent.Ollama")
-@patch("app.agent.chromadb.Client")
-def test_generate_code_empty_task(mock_chroma_client, mock_ollama):
+@patch("app.agent._chroma_client")
+def test_generate_code_empty_task(mock_chroma_client, mock_ollama, mock_embeddings):
     mock_llm = MagicMock()
     mock_chain = MagicMock()
     mock_chain.run.return_value = ""
     mock_ollama.return_value = mock_llm
     mock_chroma = MagicMock()
-    mock_chroma.get_or_create_collection.return_value = MagicMock()
+    mock_chroma.get_or_create_collection.return_value = _empty_collection()
     mock_chroma_client.return_value = mock_chroma
     with patch("app.agent.LLMChain", return_value=mock_chain):
         agent = Agent()
         result = agent.generate_code("")
         assert result == ""
 
+@patch("app.agent._embedder")
 @patch("app.agent.Ollama")
-@patch("app.agent.chromadb.Client")
-def test_generate_code_markdown_strip(mock_chroma_client, mock_ollama):
+@patch("app.agent._chroma_client")
+def test_generate_code_markdown_strip(mock_chroma_client, mock_ollama, mock_embeddings):
     mock_llm = MagicMock()
     mock_chain = MagicMock()
     mock_chain.run.return_value = "```python\ndef foo(): pass\n```"
     mock_ollama.return_value = mock_llm
     mock_chroma = MagicMock()
-    mock_chroma.get_or_create_collection.return_value = MagicMock()
+    mock_chroma.get_or_create_collection.return_value = _empty_collection()
     mock_chroma_client.return_value = mock_chroma
     with patch("app.agent.LLMChain", return_value=mock_chain):
         agent = Agent()
         result = agent.generate_code("Write a Python function")
         assert result.strip() == "def foo(): pass"
 
+@patch("app.agent._embedder")
 @patch("app.agent.Ollama")
-@patch("app.agent.chromadb.Client")
-def test_generate_code_llm_failure(mock_chroma_client, mock_ollama):
+@patch("app.agent._chroma_client")
+def test_generate_code_llm_failure(mock_chroma_client, mock_ollama, mock_embeddings):
     mock_llm = MagicMock()
     mock_chain = MagicMock()
     mock_chain.run.side_effect = Exception("LLM error")
     mock_ollama.return_value = mock_llm
     mock_chroma = MagicMock()
-    mock_chroma.get_or_create_collection.return_value = MagicMock()
+    mock_chroma.get_or_create_collection.return_value = _empty_collection()
     mock_chroma_client.return_value = mock_chroma
     with patch("app.agent.LLMChain", return_value=mock_chain):
         agent = Agent()
         with pytest.raises(Exception):
             agent.generate_code("Write a Python function")
 
+@patch("app.agent._embedder")
 @patch("app.agent.Ollama")
-@patch("app.agent.chromadb.Client")
-def test_get_history_chromadb_failure(mock_chroma_client, mock_ollama):
+@patch("app.agent._chroma_client")
+def test_get_history_chromadb_failure(mock_chroma_client, mock_ollama, mock_embeddings):
     mock_llm = MagicMock()
     mock_ollama.return_value = mock_llm
     mock_chroma = MagicMock()
@@ -106,3 +127,120 @@ def test_get_history_chromadb_failure(mock_chroma_client, mock_ollama):
     agent = Agent()
     with pytest.raises(Exception):
         agent.get_history(limit=2)
+
+@patch("app.agent._embedder")
+@patch("app.agent.Ollama")
+@patch("app.agent._chroma_client")
+def test_generate_code_strip_keeps_body_lines(mock_chroma_client, mock_ollama, mock_embeddings):
+    mock_llm = MagicMock()
+    mock_chain = MagicMock()
+    mock_chain.run.return_value = "```python\ndef foo():\n    pass\n```\nCall `foo()` to run it."
+    mock_ollama.return_value = mock_llm
+    mock_chroma = MagicMock()
+    mock_chroma.get_or_create_collection.return_value = _empty_collection()
+    mock_chroma_client.return_value = mock_chroma
+    with patch("app.agent.LLMChain", return_value=mock_chain):
+        agent = Agent()
+        result = agent.generate_code("Write a Python function")
+        assert result == "def foo():\n    pass\nCall foo() to run it."
+
+def test_doc_id_is_stable_and_separates_parts():
+    from app.agent import _doc_id
+    assert _doc_id("task", "context") == _doc_id("task", "context")
+    assert len(_doc_id("task", "context")) == 32
+    assert _doc_id("ab", "c") != _doc_id("a", "bc")
+
+def _collections_by_name(mock_chroma_client):
+    """Separate empty mock collection per name (history, response cache, review cache), created on demand."""
+    collections = {}
+    mock_chroma_client.return_value.get_or_create_collection.side_effect = (
+        lambda name, **kwargs: collections.setdefault(name, _empty_collection())
+    )
+    return collections
+
+@patch("app.agent._embedder")
+@patch("app.agent.Ollama")
+@patch("app.agent._chroma_client")
+def test_generate_code_exact_cache_hit(mock_chroma_client, mock_ollama, mock_embeddings):
+    collections = _collections_by_name(mock_chroma_client)
+    with patch("app.agent.LLMChain") as mock_chain_cls:
+        agent = Agent()
+        collections["agent_response_cache"].get.return_value = {"ids": ["id"], "metadatas": [{"response": "def foo(): pass"}]}
+        result = agent.generate_code("Write a Python function")
+        assert result == "def foo(): pass"
+        mock_chain_cls.assert_not_called()
+        mock_embeddings.return_value.embed_query.assert_not_called()
+        agent._writer.close()
+        agent._response_cache_writer.close()
+        collections["agent_history"].upsert.assert_not_called()
+        collections["agent_response_cache"].upsert.assert_not_called()
+
+@patch("app.agent._embedder")
+@patch("app.agent.Ollama")
+@patch("app.agent._chroma_client")
+def test_generate_code_semantic_cache(mock_chroma_client, mock_ollama, mock_embeddings):
+    collections = _collections_by_name(mock_chroma_client)
+    mock_embeddings.return_value.embed_query.return_value = [0.1, 0.2]
+    with patch("app.agent.LLMChain") as mock_chain_cls:
+        agent = Agent()
+        agent.response_cache.semantic = True  # as with OLLAMA_EMBEDDING_MODEL set
+        cache = collections["agent_response_cache"]
+        # Near-identical prompt: served from the response cache
+        cache.query.return_value = {"distances": [[0.01]], "metadatas": [[{"response": "def cached(): pass"}]]}
+        assert agent.generate_code("Write a Python function") == "def cached(): pass"
+        mock_chain_cls.assert_not_called()
+        # Too far away: LLM is called; history and cache reuse the prompt embedding, the cache stores the stripped code
+        cache.query.return_value = {"distances": [[0.4]], "metadatas": [[{"response": "def cached(): pass"}]]}
+        mock_chain_cls.return_value.run.return_value = "```python\ndef fresh(): pass\n```"
+        assert agent.generate_code("Write a Python function") == "def fresh(): pass"
+        agent._writer.close()
+        agent._response_cache_writer.close()
+        assert collections["agent_history"].upsert.call_args.kwargs["embeddings"] == [[0.1, 0.2]]
+        assert cache.upsert.call_args.kwargs["embeddings"] == [[0.1, 0.2]]
+        assert cache.upsert.call_args.kwargs["metadatas"] == [{"response": "def fresh(): pass"}]
+        mock_embeddings.return_value.embed_documents.assert_not_called()
+
+@patch("app.agent._embedder")
+@patch("app.agent.Ollama")
+@patch("app.agent._chroma_client")
+def test_review_code_cache_is_exact_only(mock_chroma_client, mock_ollama, mock_embeddings):
+    collections = _collections_by_name(mock_chroma_client)
+    with patch("app.agent.LLMChain") as mock_chain_cls:
+        agent = Agent()
+        mock_chain_cls.return_value.run.return_value = "Add error handling."
+        assert agent.review_code("def foo(): pass") == "Add error handling."
+        collections["agent_review_cache"].query.assert_not_called()
+        mock_embeddings.return_value.embed_query.assert_not_called()
+        collections["agent_review_cache"].get.return_value = {"ids": ["id"], "metadatas": [{"response": "Cached review."}]}
+        assert agent.review_code("def foo(): pass") == "Cached review."
+        assert mock_chain_cls.call_count == 1
+
+def test_chroma_writer_batches_and_dedupes():
+    from app.agent import _ChromaWriter
+    collection = MagicMock()
+    embeddings = MagicMock()
+    embeddings.embed_documents.return_value = [[0.4], [0.5]]
+    writer = _ChromaWriter(collection, embeddings, batch_size=50, flush_interval=5.0)
+    writer.submit("doc1", {"type": "review"}, "id1", embedding=[0.1])
+    writer.submit("doc2", {"type": "review"}, "id2", embed_text="code2")
+    writer.submit("doc1b", {"type": "review"}, "id1", embedding=[0.3])
+    writer.submit("doc3", {"type": "review"}, "id3", embed_text="code3")
+    writer.close()
+    collection.upsert.assert_called_once()
+    embeddings.embed_documents.assert_called_once_with(["code2", "code3"])
+    kwargs = collection.upsert.call_args.kwargs
+    assert kwargs["ids"] == ["id1", "id2", "id3"]
+    assert kwargs["documents"] == ["doc1b", "doc2", "doc3"]
+    assert kwargs["embeddings"] == [[0.3], [0.4], [0.5]]
+
+@patch("app.agent._embedder")
+@patch("app.agent.Ollama")
+@patch("app.agent._chroma_client")
+def test_generate_code_cache_failure_falls_through_to_llm(mock_chroma_client, mock_ollama, mock_embeddings):
+    mock_chroma_client.return_value.get_or_create_collection.return_value = _empty_collection()
+    mock_embeddings.return_value.embed_query.side_effect = RuntimeError("embedding server down")
+    with patch("app.agent.LLMChain") as mock_chain_cls:
+        mock_chain_cls.return_value.run.return_value = "def foo(): pass"
+        agent = Agent()
+        assert agent.generate_code("Write a Python function") == "def foo(): pass"
+        mock_chain_cls.return_value.run.assert_called_once()
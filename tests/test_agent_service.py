@@ -0,0 +1,132 @@
+import threading
+from collections import deque
+from unittest.mock import MagicMock, patch
+import pytest
+from langchain_core.language_models import FakeListLLM
+from langchain_core.tools import Tool
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.exceptions import OutputParserException
+from app.agentic import agent_service
+from app.agentic.agent_service import (
+    ADAPTIVE_TIMEOUT_MIN_SAMPLES, MAX_AGENT_EXECUTION_TIME, MIN_AGENT_EXECUTION_TIME,
+    AgenticAIService, _FenceTracker, _ParallelReActOutputParser, _adaptive_timeout,
+)
+
+def _streaming_llm(*chunks):
+    """LLM mock whose astream yields the given chunks."""
+    llm = MagicMock()
+    llm.model_name = "test-model"
+    async def astream(prompt):
+        for chunk in chunks:
+            yield chunk
+    llm.astream = astream
+    return llm
+
+def test_run_falls_through_to_llm_when_cache_and_memory_fail():
+    llm = _streaming_llm("```python\nx = 1\n```")
+    cache = MagicMock()
+    cache.lookup.side_effect = RuntimeError("embedding server down")
+    memory = MagicMock()
+    memory.get_memory.side_effect = RuntimeError("chroma down")
+    service = AgenticAIService(llm, [], memory_service=memory, response_cache=cache)
+    result = service.run("Write x")
+    assert result["code"] == "x = 1"
+    assert "error" not in result
+
+def test_run_returns_before_background_write_finishes():
+    llm = _streaming_llm("```python\nx = 1\n```")
+    release, written = threading.Event(), threading.Event()
+    memory = MagicMock()
+    memory.get_memory.return_value = {"history": ""}
+    def slow_add_memory(query, data):
+        release.wait(5)
+        written.set()
+    memory.add_memory.side_effect = slow_add_memory
+    service = AgenticAIService(llm, [], memory_service=memory)
+    assert service.run("Write x")["code"] == "x = 1"
+    assert not written.is_set()
+    release.set()
+    assert written.wait(5)
+
+def test_parser_splits_multiple_actions_with_their_own_log():
+    text = ("Thought: two lookups\nAction: search\nAction Input: \"python\"\n"
+            "Action: wiki\nAction Input: asyncio")
+    actions = _ParallelReActOutputParser().parse(text)
+    assert isinstance(actions, list)
+    assert all(isinstance(action, AgentAction) for action in actions)
+    assert [(a.tool, a.tool_input) for a in actions] == [("search", "python"), ("wiki", "asyncio")]
+    assert actions[0].log == "Thought: two lookups\nAction: search\nAction Input: \"python\""
+    assert actions[1].log == "\nAction: wiki\nAction Input: asyncio"
+    assert "".join(action.log for action in actions) == text
+
+def test_parser_single_action_falls_back_to_react_parser():
+    action = _ParallelReActOutputParser().parse("Thought: look\nAction: search\nAction Input: python")
+    assert isinstance(action, AgentAction)
+    assert (action.tool, action.tool_input) == ("search", "python")
+
+def test_parser_final_answer_mixed_with_actions_is_not_run_in_parallel():
+    text = ("Action: search\nAction Input: a\nAction: wiki\nAction Input: b\n"
+            "Final Answer: done")
+    with pytest.raises(OutputParserException):
+        _ParallelReActOutputParser().parse(text)
+    finish = _ParallelReActOutputParser().parse("Thought: known\nFinal Answer: done")
+    assert isinstance(finish, AgentFinish)
+    assert finish.return_values["output"] == "done"
+
+def test_fence_tracker_finds_fence_split_across_chunks():
+    tracker = _FenceTracker()
+    assert not tracker.feed("Here:\n`")
+    assert not tracker.feed("``python\nx = 1\n`")
+    assert tracker.fences == 1
+    assert tracker.feed("``\ntrailing text")
+    assert tracker.fences == 2
+
+def test_adaptive_timeout_uses_ceiling_until_enough_samples(monkeypatch):
+    monkeypatch.setattr(agent_service, "_run_durations", deque([1.0] * (ADAPTIVE_TIMEOUT_MIN_SAMPLES - 1), maxlen=200))
+    assert _adaptive_timeout() == MAX_AGENT_EXECUTION_TIME == 60
+
+def test_adaptive_timeout_is_clamped(monkeypatch):
+    monkeypatch.setattr(agent_service, "_run_durations", deque([1.0] * 50, maxlen=200))
+    assert _adaptive_timeout() == MIN_AGENT_EXECUTION_TIME == 10
+    monkeypatch.setattr(agent_service, "_run_durations", deque([100.0] * 50, maxlen=200))
+    assert _adaptive_timeout() == MAX_AGENT_EXECUTION_TIME
+    monkeypatch.setattr(agent_service, "_run_durations", deque([10.0] * 50, maxlen=200))
+    assert _adaptive_timeout() == 20
+
+def test_run_iteration_limit_is_an_error_and_not_cached():
+    llm = FakeListLLM(responses=["Thought: look\nAction: search\nAction Input: q"])
+    tools = [Tool(name=name, func=lambda q: "nothing", description=name) for name in ("search", "wiki")]
+    cache = MagicMock()
+    cache.lookup.return_value = (None, [0.1])
+    memory = MagicMock()
+    memory.get_memory.return_value = {"history": ""}
+    service = AgenticAIService(llm, tools, memory_service=memory, response_cache=cache)
+    with patch.object(agent_service, "_persist_executor") as persist_executor:
+        result = service.run("q")
+    assert result["error"] == "Agent stopped due to iteration or time limit."
+    assert "code" not in result
+    assert len(result["trace"]) == agent_service.MAX_AGENT_ITERATIONS
+    persist_executor.submit.assert_not_called()
+
+def _recording_tool(observation):
+    calls = []
+    def search(tool_input):
+        calls.append(tool_input)
+        return observation
+    return Tool(name="search", func=search, description="web search"), calls
+
+def test_single_tool_run_passes_first_line_as_tool_input():
+    tool, calls = _recording_tool("asyncio docs")
+    llm = FakeListLLM(responses=['"python asyncio"\nbecause the user asked', "Here:\n```python\nimport asyncio\n```"])
+    result = AgenticAIService(llm, [tool]).run("How do I use asyncio?")
+    assert calls == ["python asyncio"]
+    assert result["trace"] == [{"action": "search", "input": "python asyncio", "observation": "asyncio docs"}]
+    assert result["code"] == "import asyncio"
+
+def test_single_tool_run_falls_back_to_query_on_empty_reply():
+    tool, calls = _recording_tool("nothing")
+    llm = FakeListLLM(responses=["   ", "x = 1"])
+    result = AgenticAIService(llm, [tool]).run("Write x")
+    assert calls == ["Write x"]
+    assert result["trace"][0]["input"] == "Write x"
+    assert result["code"] == "x = 1"
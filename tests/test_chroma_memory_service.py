@@ -0,0 +1,72 @@
+import logging
+import threading
+from unittest.mock import patch
+import pytest
+from app.memory import chroma_memory_service
+from app.memory.chroma_memory_service import ChromaMemoryService
+
+@pytest.fixture
+def service(tmp_path):
+    with patch("app.memory.chroma_memory_service.ChromaClient") as mock_client, \
+         patch("app.memory.chroma_memory_service.get_embeddings") as mock_embeddings:
+        mock_embeddings.return_value.embed_documents.side_effect = lambda texts: [[0.1] for _ in texts]
+        svc = ChromaMemoryService(persist_directory=str(tmp_path))
+        yield svc
+
+def test_add_memory_buffers_until_flush(service, monkeypatch):
+    monkeypatch.setattr(chroma_memory_service, "MEMORY_FLUSH_INTERVAL", 60)
+    service.add_memory("q1", {"output": "a1"})
+    service.add_memory("q2", {"output": "a2"})
+    service._collection.add.assert_not_called()
+    service.flush()
+    # One embed_documents call and one collection.add for the whole buffer
+    service.embeddings.embed_documents.assert_called_once_with(["input: q1\noutput: a1", "input: q2\noutput: a2"])
+    service._collection.add.assert_called_once()
+    assert service._collection.add.call_args.kwargs["documents"] == ["input: q1\noutput: a1", "input: q2\noutput: a2"]
+    assert service._flush_timer is None
+    service.flush()
+    service._collection.add.assert_called_once()
+
+def test_add_memory_flushes_at_size_limit(service, monkeypatch):
+    monkeypatch.setattr(chroma_memory_service, "MEMORY_FLUSH_INTERVAL", 60)
+    monkeypatch.setattr(chroma_memory_service, "MEMORY_FLUSH_SIZE", 3)
+    for i in range(3):
+        service.add_memory(f"q{i}")
+    service._collection.add.assert_called_once()
+    assert len(service._collection.add.call_args.kwargs["documents"]) == 3
+    assert service._buf == [] and service._flush_timer is None
+
+def test_add_memory_flushes_on_timer(service, monkeypatch):
+    monkeypatch.setattr(chroma_memory_service, "MEMORY_FLUSH_INTERVAL", 0.01)
+    written = threading.Event()
+    service._collection.add.side_effect = lambda **kwargs: written.set()
+    service.add_memory("q1")
+    assert written.wait(5)
+    assert service._collection.add.call_args.kwargs["documents"] == ["input: q1"]
+
+def test_timed_flush_failure_is_logged(service, caplog):
+    service._collection.add.side_effect = RuntimeError("chroma down")
+    service._buf.append("input: q1")
+    with caplog.at_level(logging.ERROR, logger=chroma_memory_service.__name__):
+        service._timed_flush()
+    assert "chroma down" in caplog.text
+
+def test_get_memory_shape_and_k(service):
+    service.embeddings.embed_query.return_value = [0.2]
+    service._collection.query.return_value = {"documents": [["input: q1", "input: q2"]]}
+    assert service.get_memory("q", k=2) == {"history": "input: q1\ninput: q2"}
+    service._collection.query.assert_called_once_with(query_embeddings=[[0.2]], n_results=2, include=["documents"])
+
+def test_clear_memory_deletes_in_batches(service, monkeypatch):
+    monkeypatch.setattr(chroma_memory_service, "MEMORY_CLEAR_BATCH_SIZE", 2)
+    service._buf.append("input: pending")
+    service._collection.get.side_effect = [{"ids": ["a", "b"]}, {"ids": ["c"]}, {"ids": []}]
+    service.clear_memory()
+    assert service._buf == []
+    assert [c.kwargs["ids"] for c in service._collection.delete.call_args_list] == [["a", "b"], ["c"]]
+    service._collection.get.assert_called_with(limit=2, include=[])
+
+def test_memory_collection_uses_cosine_space(service):
+    service.chroma_client.get_or_create_collection.assert_called_once_with(
+        "agent_memory", metadata={"hnsw:space": "cosine"}
+    )
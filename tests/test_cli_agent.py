@@ -2,6 +2,8 @@ import subprocess
 import sys
 import os
 import pytest
+from unittest.mock import MagicMock, patch
+from app import cli_agent
 
 def run_cli(args):
     """Helper to run the CLI agent script with given args and return output."""
@@ -20,3 +22,18 @@ def test_cli_review_code():
     result = run_cli(['review', '--code', code])
     assert result.returncode == 0
     assert 'review' in result.stdout.lower() or 'improvement' in result.stdout.lower() or 'bug' in result.stdout.lower()
+
+def test_cli_mcp_generate(monkeypatch, capsys):
+    agent = MagicMock()
+    agent.response_cache = None
+    async def astream(prompt):
+        yield "```python\nx = 1\n```"
+    agent.llm.astream = astream
+    cli_agent.get_agentic_service.cache_clear()
+    monkeypatch.setattr(sys, 'argv', ['cli_agent.py', 'mcp', '--context-type', 'generate', '--payload', '{"task": "Write x"}'])
+    with patch.object(cli_agent, 'get_agent', return_value=agent):
+        cli_agent.main()
+    cli_agent.get_agentic_service.cache_clear()
+    out = capsys.readouterr().out
+    assert '"status": "ok"' in out
+    assert 'x = 1' in out
@@ -14,7 +14,7 @@ def test_model_name_default(monkeypatch):
     monkeypatch.delenv("OLLAMA_MODEL", raising=False)
     import importlib
     importlib.reload(config)
-    assert config.MODEL_NAME == "qwen2.5-coder:0.5b"
+    assert config.MODEL_NAME == "qwen2.5-coder:0.5b-instruct-q4_K_M"
 
 def test_chroma_collection_env(monkeypatch):
     monkeypatch.setenv("CHROMA_COLLECTION", "test_collection")
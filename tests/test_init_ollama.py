@@ -0,0 +1,37 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+import httpx
+from app import init_ollama
+from app.init_ollama import wait_for_ollama_async
+
+def _tags(*names):
+    response = MagicMock(status_code=200)
+    response.json.return_value = {"models": [{"name": name} for name in names]}
+    return response
+
+def _wait(client, timeout=150.0):
+    with patch.object(init_ollama.asyncio, "sleep", new=AsyncMock()) as sleep:
+        return asyncio.run(wait_for_ollama_async(client, timeout=timeout)), sleep
+
+def test_ready_after_service_starts():
+    client = MagicMock(spec=httpx.AsyncClient)
+    client.get = AsyncMock(side_effect=[httpx.ConnectError("refused"), _tags(init_ollama.MODEL_NAME)])
+    ready, sleep = _wait(client)
+    assert ready
+    assert client.get.await_count == 2
+    sleep.assert_awaited_once_with(0.1)
+
+def test_waits_with_backoff_until_model_is_pulled():
+    client = MagicMock(spec=httpx.AsyncClient)
+    client.get = AsyncMock(side_effect=[_tags(), _tags("other"), _tags(init_ollama.MODEL_NAME)])
+    ready, sleep = _wait(client)
+    assert ready
+    assert [c.args[0] for c in sleep.await_args_list] == [0.1, 0.2]
+
+def test_times_out_when_model_never_appears():
+    client = MagicMock(spec=httpx.AsyncClient)
+    client.get = AsyncMock(return_value=_tags("other"))
+    # The clock doesn't advance (sleep is mocked), so the deadline is reached once the delay exceeds it
+    ready, sleep = _wait(client, timeout=1.0)
+    assert not ready
+    assert [c.args[0] for c in sleep.await_args_list] == [0.1, 0.2, 0.4, 0.8]
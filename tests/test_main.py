@@ -0,0 +1,88 @@
+import asyncio
+from unittest.mock import MagicMock
+import pytest
+from fastapi.testclient import TestClient
+from app import main
+
+@pytest.fixture
+def client(monkeypatch):
+    """TestClient without the lifespan (no Ollama/Chroma), with a mocked agentic_service."""
+    service = MagicMock()
+    service.run.side_effect = lambda task, context="": {"code": f"# {task}", "model": "test-model"}
+    monkeypatch.setattr(main, "agentic_service", service)
+    monkeypatch.setattr(main, "_exact_cache", main.OrderedDict())
+    return TestClient(main.app), service
+
+def test_generate_repeat_served_from_exact_cache(client):
+    http, service = client
+    first = http.post("/generate", json={"task": "add", "context": "ints"})
+    second = http.post("/generate", json={"task": "add", "context": "ints"})
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    service.run.assert_called_once_with("add", "ints")
+    http.post("/generate", json={"task": "add", "context": "floats"})
+    assert service.run.call_count == 2
+
+def test_generate_errors_are_not_cached(client):
+    http, service = client
+    service.run.side_effect = lambda task, context="": {"error": "Agent stopped", "trace": []}
+    http.post("/generate", json={"task": "add"})
+    response = http.post("/generate", json={"task": "add"})
+    assert response.json()["error"] == "Agent stopped"
+    assert service.run.call_count == 2
+    assert len(main._exact_cache) == 0
+
+def test_exact_cache_evicts_least_recently_used(client, monkeypatch):
+    http, service = client
+    monkeypatch.setattr(main, "EXACT_CACHE_SIZE", 2)
+    for task in ("a", "b", "a", "c"):
+        http.post("/generate", json={"task": task})
+    # "b" was least recently used when "c" pushed the cache past its size
+    assert len(main._exact_cache) == 2
+    http.post("/generate", json={"task": "a"})
+    assert service.run.call_count == 3
+    http.post("/generate", json={"task": "b"})
+    assert service.run.call_count == 4
+
+def test_batch_uses_exact_cache(client):
+    http, service = client
+    response = http.post("/generate/batch", json=[{"task": "a"}, {"task": "b"}])
+    assert [item["code"] for item in response.json()] == ["# a", "# b"]
+    http.post("/generate", json={"task": "a"})
+    assert service.run.call_count == 2
+
+@pytest.mark.parametrize("path,body", [
+    ("/generate", {"task": "   "}),
+    ("/generate/batch", [{"task": "ok"}, {"task": ""}]),
+])
+def test_blank_task_returns_422(client, path, body):
+    http, service = client
+    assert http.post(path, json=body).status_code == 422
+    service.run.assert_not_called()
+
+@pytest.mark.parametrize("params", [{"limit": 0}, {"offset": -1}])
+def test_history_rejects_invalid_paging(client, params):
+    http, service = client
+    assert http.get("/history", params=params).status_code == 422
+    service.history.assert_not_called()
+
+def test_lifespan_cancels_ollama_wait_when_a_service_fails(monkeypatch):
+    cancelled = asyncio.Event()
+    async def wait_forever(client):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+    def chroma_unreachable():
+        raise ConnectionError("chroma down")
+    monkeypatch.setattr(main, "wait_for_ollama_async", wait_forever)
+    monkeypatch.setattr(main, "load_agent_tools", lambda llm: [])
+    monkeypatch.setattr(main, "ChromaMemoryService", chroma_unreachable)
+    monkeypatch.setattr(main, "Agent", lambda llm: MagicMock())
+    async def start():
+        async with main.lifespan(main.app):
+            pass
+    with pytest.raises(ConnectionError):
+        asyncio.run(asyncio.wait_for(start(), timeout=5))
+    assert cancelled.is_set()
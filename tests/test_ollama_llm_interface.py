@@ -0,0 +1,27 @@
+from unittest.mock import MagicMock, patch
+from app.llm import ollama_llm_interface
+from app.llm.ollama_llm_interface import PooledOllamaEmbeddings
+
+def test_embedding_requests_send_keep_alive_and_num_ctx():
+    embeddings = PooledOllamaEmbeddings(model="m", base_url="http://ollama", num_ctx=4096, keep_alive=-1)
+    http = MagicMock()
+    http.post.return_value.status_code = 200
+    http.post.return_value.json.return_value = {"embeddings": [[0.1]]}
+    with patch.object(ollama_llm_interface, "_embedding_http_client", return_value=http):
+        assert embeddings.embed_query("q") == [0.1]
+    payload = http.post.call_args.kwargs["json"]
+    assert payload["keep_alive"] == -1
+    assert payload["options"]["num_ctx"] == 4096
+
+def test_embed_documents_is_one_batch_request():
+    embeddings = PooledOllamaEmbeddings(model="m", base_url="http://ollama")
+    http = MagicMock()
+    http.post.return_value.status_code = 200
+    http.post.return_value.json.return_value = {"embeddings": [[0.1], [0.2]]}
+    with patch.object(ollama_llm_interface, "_embedding_http_client", return_value=http):
+        assert embeddings.embed_documents(["a", "b"]) == [[0.1], [0.2]]
+        assert embeddings.embed_documents([]) == []
+    http.post.assert_called_once()
+    assert http.post.call_args.args[0] == "http://ollama/api/embed"
+    assert http.post.call_args.kwargs["json"]["input"] == ["passage: a", "passage: b"]
+    assert "keep_alive" not in http.post.call_args.kwargs["json"]
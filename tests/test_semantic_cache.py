@@ -0,0 +1,44 @@
+from unittest.mock import MagicMock
+from app.memory.semantic_cache import SemanticCache
+
+def _cache(get_result, query_result, semantic=True):
+    collection = MagicMock()
+    collection.get.return_value = get_result
+    collection.query.return_value = query_result
+    client = MagicMock()
+    client.get_or_create_collection.return_value = collection
+    embeddings = MagicMock()
+    embeddings.embed_query.return_value = [0.1, 0.2]
+    return SemanticCache(client, embeddings, similarity_threshold=0.9, semantic=semantic), collection, embeddings
+
+def test_make_key_includes_context():
+    assert SemanticCache.make_key("task") == "task"
+    assert SemanticCache.make_key("task", "ctx") == "task\x00ctx"
+    assert SemanticCache.make_key("a\nb") != SemanticCache.make_key("a", "b")
+    assert SemanticCache._key_id(SemanticCache.make_key("a\nb")) != SemanticCache._key_id(SemanticCache.make_key("a", "b"))
+
+def test_lookup_exact_hit_skips_embedding():
+    cache, _, embeddings = _cache({"ids": ["x"], "metadatas": [{"response": "cached"}]}, None)
+    assert cache.lookup("task") == ("cached", None)
+    embeddings.embed_query.assert_not_called()
+
+def test_lookup_semantic_threshold():
+    miss = {"ids": [], "metadatas": []}
+    cache, _, _ = _cache(miss, {"distances": [[0.05]], "metadatas": [[{"response": "near"}]]})
+    assert cache.lookup("task") == ("near", [0.1, 0.2])
+    cache, _, _ = _cache(miss, {"distances": [[0.2]], "metadatas": [[{"response": "far"}]]})
+    assert cache.lookup("task") == (None, [0.1, 0.2])
+
+def test_lookup_exact_only_without_embedding_model():
+    miss = {"ids": [], "metadatas": []}
+    cache, collection, embeddings = _cache(miss, {"distances": [[0.0]], "metadatas": [[{"response": "near"}]]}, semantic=False)
+    assert cache.lookup("task") == (None, None)
+    embeddings.embed_query.assert_not_called()
+    collection.query.assert_not_called()
+
+def test_store_reuses_embedding():
+    cache, collection, embeddings = _cache(None, None)
+    cache.store("task", "code", [0.3])
+    embeddings.embed_query.assert_not_called()
+    assert collection.upsert.call_args.kwargs["embeddings"] == [[0.3]]
+    assert collection.upsert.call_args.kwargs["metadatas"] == [{"response": "code"}]